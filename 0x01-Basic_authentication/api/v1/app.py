@@ -6,6 +6,8 @@ from os import getenv
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
+from api.v1.instrumentation import instrumentation
+from models.base import Base
 import os
 
 
@@ -25,7 +27,7 @@ if auth_type:
         auth = Auth()
 
 EXCLUDED_PATHS = ['/api/v1/status/', '/api/v1/unauthorized/',
-                  '/api/v1/forbidden/']
+                  '/api/v1/forbidden/', '/api/v1/metrics/']
 
 
 @app.before_request
@@ -69,6 +71,13 @@ def forbidden(error) -> str:
     return jsonify({"error": "Forbidden"}), 403
 
 
+instrumentation.instrument_app(app)
+instrumentation.instrument_object(auth, ['current_user'], 'auth')
+instrumentation.instrument_class(
+    Base, ['get', 'search', 'count', 'save', 'remove', 'save_to_file'],
+    'store')
+
+
 \
 if __name__ == "__main__":
     host = getenv("API_HOST", "0.0.0.0")
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import jsonify, abort, Response
 from api.v1.views import app_views
+from api.v1.instrumentation import instrumentation
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
@@ -25,6 +26,17 @@ def stats() -> str:
     stats['users'] = User.count()
     return jsonify(stats)
 
+
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics() -> str:
+    """ GET /api/v1/metrics
+    Return:
+      - latency quantiles per route and stage, Prometheus text format
+    """
+    return Response(instrumentation.metrics.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
 def unauthorized() -> str:
     """ GET /api/v1/unauthorized
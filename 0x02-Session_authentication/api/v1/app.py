@@ -3,13 +3,22 @@
 Route module for the API
 """
 from os import getenv
-from api.v1.views import app_views
+from api.v1.views import app_views, store_loader
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
+from api.v1.auth.path_matcher import PathMatcher
+from api.v1.instrumentation import instrumentation
+try:
+    from api.v1.json_provider import FastJSONProvider
+except ImportError:  # Flask < 2.2 has no JSON provider API
+    FastJSONProvider = None
+from models.base import Base
 import os
 
 
 app = Flask(__name__)
+if FastJSONProvider is not None:
+    app.json = FastJSONProvider(app)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
@@ -26,9 +35,23 @@ if auth_type:
     elif auth_type == 'session_auth':
         from api.v1.auth.session_auth import SessionAuth
         auth = SessionAuth()
+    elif auth_type == 'signed_session_auth':
+        from api.v1.auth.signed_session_auth import SignedSessionAuth
+        auth = SignedSessionAuth()
+    elif auth_type == 'chain_auth':
+        from api.v1.auth.chain_auth import ChainAuth
+        auth = ChainAuth.from_names(
+            os.getenv('AUTH_CHAIN', 'session_auth,basic_auth'))
 
 EXCLUDED_PATHS = ['/api/v1/status/', '/api/v1/unauthorized/',
-                  '/api/v1/forbidden/', 'api/v1/auth_session/login/']
+                  '/api/v1/forbidden/', 'api/v1/auth_session/login/',
+                  '/api/v1/metrics/']
+excluded_paths_matcher = PathMatcher(EXCLUDED_PATHS)
+# Paths answered while the store still loads in the background
+STORE_FREE_PATHS = ['/api/v1/status/', '/api/v1/unauthorized/',
+                    '/api/v1/forbidden/', '/api/v1/metrics/']
+store_free_matcher = PathMatcher(STORE_FREE_PATHS)
+STORE_READY_TIMEOUT = float(getenv('STORE_READY_TIMEOUT', 30))
 
 
 @app.before_request
@@ -36,16 +59,20 @@ def before_request_handler():
     """
     called before every request to filter requests based on authentication.
     """
+    if not store_loader.loaded() and \
+            store_free_matcher.require_auth(request.path) and \
+            not store_loader.wait(STORE_READY_TIMEOUT):
+        abort(503)
+
     if auth is None:
         return
 
-    path = request.path
-
-    if not auth.require_auth(path, EXCLUDED_PATHS):
+    if not excluded_paths_matcher.require_auth(request.path):
         return
 
-    if auth.authorization_header(request) is None and auth.session_cookie(request) is None:
-        return None, abort(401)
+    context = auth.auth_context(request)
+    if context.authorization is None and context.session_id is None:
+        abort(401)
 
     current_user = auth.current_user(request)
     if current_user is None:
@@ -75,6 +102,24 @@ def forbidden(error) -> str:
     return jsonify({"error": "Forbidden"}), 403
 
 
+@app.errorhandler(503)
+def unavailable(error) -> str:
+    """ Store not loaded yet handler
+    """
+    response = jsonify({"error": "Service Unavailable"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+instrumentation.instrument_app(app)
+instrumentation.instrument_object(
+    auth, ['auth_context', 'current_user', 'create_session',
+           'destroy_session'], 'auth')
+instrumentation.instrument_class(
+    Base, ['get', 'search', 'count', 'save', 'remove', 'save_to_file'],
+    'store')
+
+
 if __name__ == "__main__":
     host = getenv("API_HOST", "0.0.0.0")
     port = getenv("API_PORT", "5000")
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Module for authorization"""
 from flask import request
+from api.v1.auth.path_matcher import compile_excluded_paths
 from typing import List, TypeVar
 import os
 
@@ -8,49 +9,71 @@ import os
 User = TypeVar('User')
 
 
+class AuthContext:
+    """Parsed authentication inputs of a single request"""
+    def __init__(self, request, session_name: str = None):
+        """Reads the Authorization header and the session cookie once"""
+        self.authorization = request.headers.get('Authorization')
+        self.session_id = None
+        if session_name is not None:
+            self.session_id = request.cookies.get(session_name)
+        self.user = None
+        self.user_resolved = False
+
+
 class Auth:
     """Defines a class Auth"""
+    def __init__(self):
+        """Reads the auth configuration once at startup"""
+        self.session_name = os.getenv('SESSION_NAME')
+
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
         """Defines routes that dont need authentication"""
-        if path is None:
-            return True
         if not excluded_paths:
             return True
-        if not path.endswith('/'):
-            path += '/'
+        matcher = compile_excluded_paths(tuple(excluded_paths))
+        return matcher.require_auth(path)
 
-        for excluded_path in excluded_paths:
-            if excluded_path.endswith('*'):
-                if path.startswith(excluded_path[:-1]):
-                    return False
+    def auth_context(self, request=None) -> AuthContext:
+        """Returns the auth context of a request, built on first use"""
+        if request is None:
+            return None
 
-            elif path == excluded_path:
-                return False
-        return True
+        context = getattr(request, 'auth_context', None)
+        if context is None:
+            context = AuthContext(request, self.session_name)
+            request.auth_context = context
+
+        return context
 
     def authorization_header(self, request=None) -> str:
         """Returns value of header request"""
-        if request is None:
+        context = self.auth_context(request)
+        if context is None:
             return None
 
-        auth_header = request.headers.get('Authorization')
-        if auth_header is None:
+        return context.authorization
+
+    def current_user(self, request=None) -> User:
+        """Returns the user of a request, resolved once per request"""
+        context = self.auth_context(request)
+        if context is None:
             return None
 
-        return auth_header
+        if not context.user_resolved:
+            context.user = self.user_from_context(context)
+            context.user_resolved = True
 
-    def current_user(self, request=None) -> User:
+        return context.user
+
+    def user_from_context(self, context: AuthContext) -> User:
         """Returns None"""
         return None
 
     def session_cookie(self, request=None):
         """Return value of cookie"""
-        if request is None:
-            return None
-
-        session_name = os.getenv('SESSION_NAME')
-
-        if session_name is None:
+        context = self.auth_context(request)
+        if context is None:
             return None
 
-        return request.cookies.get(session_name)
+        return context.session_id
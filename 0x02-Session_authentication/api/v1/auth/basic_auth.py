@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """Module Basic Auth that inherits from Auth"""
 import base64
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, AuthContext
 from typing import TypeVar
 from models.user import User
 
@@ -77,12 +77,9 @@ class BasicAuth(Auth):
 
         return user
 
-    def current_user(self, request=None) -> User_1:
-        """Retrieves the User instance for a request."""
-        if request is None:
-            return None
-
-        auth_header = self.authorization_header(request)
+    def user_from_context(self, context: AuthContext) -> User_1:
+        """Retrieves the User instance for a request's auth context."""
+        auth_header = context.authorization
         if auth_header is None:
             return None
 
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Module for the compiled excluded paths matcher"""
+from functools import lru_cache
+from typing import List
+
+
+# Trie markers, ints so they never collide with path characters
+EXACT = 0
+PREFIX = 1
+
+
+class PathMatcher:
+    """Character trie built once from a list of excluded paths.
+
+    Exact entries mark the node of their last character as terminal,
+    entries ending with '*' mark the node before the star as a prefix
+    match. A lookup walks the path once, so it costs O(len(path)).
+    """
+    CACHE_SIZE = 1024
+
+    def __init__(self, excluded_paths: List[str] = None):
+        """Compile the excluded paths into the trie"""
+        self._root = {}
+        self._empty = not excluded_paths
+        for excluded_path in excluded_paths or []:
+            self._add(excluded_path)
+        self.require_auth = lru_cache(maxsize=self.CACHE_SIZE)(
+            self._require_auth)
+
+    def _add(self, excluded_path: str) -> None:
+        """Insert one excluded path in the trie"""
+        wildcard = excluded_path.endswith('*')
+        if wildcard:
+            excluded_path = excluded_path[:-1]
+
+        node = self._root
+        for char in excluded_path:
+            node = node.setdefault(char, {})
+
+        if wildcard:
+            node[PREFIX] = True
+        else:
+            node[EXACT] = True
+
+    def _require_auth(self, path: str) -> bool:
+        """Return False if the path is excluded from authentication"""
+        if path is None:
+            return True
+        if self._empty:
+            return True
+        if not path.endswith('/'):
+            path += '/'
+
+        node = self._root
+        for char in path:
+            if PREFIX in node:
+                return False
+            node = node.get(char)
+            if node is None:
+                return True
+        return PREFIX not in node and EXACT not in node
+
+
+@lru_cache(maxsize=32)
+def compile_excluded_paths(excluded_paths: tuple) -> PathMatcher:
+    """Return a shared matcher for a tuple of excluded paths"""
+    return PathMatcher(list(excluded_paths))
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """Module for Session auth"""
 import uuid
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, AuthContext
 from models.user import User
 
 
@@ -9,6 +9,7 @@ class SessionAuth(Auth):
     """Defines session auth"""
     def __init__(self):
         """Initialize user by session id"""
+        super().__init__()
         self.user_id_by_session_id = {}
 
     def create_session(self, user_id: str = None) -> str:
@@ -29,10 +30,9 @@ class SessionAuth(Auth):
 
         return self.user_id_by_session_id.get(session_id)
 
-    def current_user(self, request=None):
+    def user_from_context(self, context: AuthContext):
         """Return user based on session cookie"""
-        session_id = self.session_cookie(request)
-        user_id = self.user_id_for_session_id(session_id)
+        user_id = self.user_id_for_session_id(context.session_id)
 
         if user_id:
             return User.get(user_id)
@@ -52,6 +52,9 @@ class SessionAuth(Auth):
             return False
 
         del self.user_id_by_session_id[session_id]
+        context = self.auth_context(request)
+        context.user = None
+        context.user_resolved = True
 
         return True
         
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Module for stateless signed session tokens"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import re
+import secrets
+import time
+import uuid
+from threading import Lock
+from api.v1.auth.session_auth import SessionAuth
+
+TOKEN_PART = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def _b64encode(data: bytes) -> str:
+    """Url safe base64 without padding"""
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    """Reverse of _b64encode"""
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class SignedSessionAuth(SessionAuth):
+    """Session auth where the cookie is an HMAC signed token.
+
+    A token is `kid.payload.signature`: kid selects the signing key,
+    payload carries the user id, issue time, expiry and a token id.
+    Verification needs no store lookup, only the revoked token ids are
+    kept in a small bounded denylist.
+
+    SESSION_KEYS holds `kid:secret` pairs separated by commas, the first
+    one signs new tokens and all of them verify, which allows rotation.
+    It is required, so that every worker verifies the tokens of the
+    others: set SESSION_KEYS=random for a key valid in this process only.
+
+    The denylist is per process: a logout on one worker doesn't revoke
+    the token on the others, it stays valid there until it expires, so
+    keep SESSION_DURATION short when running several workers. A full
+    denylist refuses new revocations rather than forgetting old ones.
+    """
+    def __init__(self):
+        """Initialize keys, session duration and denylist"""
+        super().__init__()
+        self.keys = {}
+        self.active_kid = None
+        for pair in os.getenv('SESSION_KEYS', '').split(','):
+            if ':' not in pair:
+                continue
+            kid, secret = pair.strip().split(':', 1)
+            self.keys[kid] = secret.encode('utf-8')
+            if self.active_kid is None:
+                self.active_kid = kid
+        if self.active_kid is None:
+            if os.getenv('SESSION_KEYS') != 'random':
+                raise ValueError("SESSION_KEYS must list kid:secret pairs, "
+                                 "or be random for a single process")
+            self.active_kid = 'local'
+            self.keys[self.active_kid] = secrets.token_bytes(32)
+
+        try:
+            self.session_duration = int(os.getenv('SESSION_DURATION', 3600))
+        except ValueError:
+            self.session_duration = 3600
+        try:
+            self.denylist_size = int(os.getenv('SESSION_DENYLIST_SIZE', 1024))
+        except ValueError:
+            self.denylist_size = 1024
+        self._denylist = {}
+        self._denylist_lock = Lock()
+
+    def _sign(self, kid: str, payload: str) -> str:
+        """Return the signature of a payload with the key kid"""
+        message = '{}.{}'.format(kid, payload).encode('ascii')
+        digest = hmac.new(self.keys[kid], message, hashlib.sha256).digest()
+        return _b64encode(digest)
+
+    def create_session(self, user_id: str = None) -> str:
+        """Create a signed session token"""
+        if user_id is None or not isinstance(user_id, str):
+            return None
+
+        now = int(time.time())
+        claims = {'sub': user_id, 'iat': now, 'jti': uuid.uuid4().hex}
+        if self.session_duration > 0:
+            claims['exp'] = now + self.session_duration
+        payload = _b64encode(json.dumps(claims,
+                                        separators=(',', ':')).encode())
+
+        kid = self.active_kid
+        return '{}.{}.{}'.format(kid, payload, self._sign(kid, payload))
+
+    def claims_for_session_id(self, session_id: str = None) -> dict:
+        """Return the verified claims of a token, None if invalid"""
+        if session_id is None or not isinstance(session_id, str):
+            return None
+
+        parts = session_id.split('.')
+        if len(parts) != 3:
+            return None
+        if not all(TOKEN_PART.fullmatch(part) for part in parts):
+            return None
+        kid, payload, signature = parts
+        if kid not in self.keys:
+            return None
+        if not hmac.compare_digest(signature.encode('ascii'),
+                                   self._sign(kid, payload).encode('ascii')):
+            return None
+
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+        if not isinstance(claims, dict):
+            return None
+
+        expiry = claims.get('exp')
+        if expiry is not None and expiry < time.time():
+            return None
+        if claims.get('jti') in self._denylist:
+            return None
+        return claims
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """Return the user id carried by a valid token"""
+        claims = self.claims_for_session_id(session_id)
+        if claims is None:
+            return None
+
+        return claims.get('sub')
+
+    def revoke(self, claims: dict) -> bool:
+        """Add a token id to the denylist until the token expires, False
+        if the denylist is full of unexpired tokens"""
+        if self.denylist_size <= 0:
+            return False
+
+        now = time.time()
+        expiry = claims.get('exp', math.inf)
+        with self._denylist_lock:
+            for jti, jti_expiry in list(self._denylist.items()):
+                if jti_expiry < now:
+                    del self._denylist[jti]
+            if len(self._denylist) >= self.denylist_size:
+                logging.getLogger(__name__).warning(
+                    "Session denylist full (%d tokens), token %s not "
+                    "revoked", self.denylist_size, claims.get('jti'))
+                return False
+            self._denylist[claims.get('jti')] = expiry
+        return True
+
+    def destroy_session(self, request=None):
+        """Logs Out current user by revoking the token"""
+        if request is None:
+            return False
+
+        claims = self.claims_for_session_id(self.session_cookie(request))
+        if claims is None:
+            return False
+
+        if not self.revoke(claims):
+            return False
+        context = self.auth_context(request)
+        context.user = None
+        context.user_resolved = True
+
+        return True
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Module for the Flask JSON provider backed by models.serializer"""
+from flask.json.provider import DefaultJSONProvider
+
+from models import serializer
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify through serializer.dumps (orjson when installed).
+
+    Responses get the encoded bytes directly instead of a str encoded a
+    second time. Indented debug output keeps the default provider.
+    """
+
+    def _pretty(self) -> bool:
+        """Whether responses are indented"""
+        return (self.compact is None and self._app.debug) or \
+            self.compact is False
+
+    def dumps(self, obj, **kwargs) -> str:
+        """Serialize to a str"""
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return serializer.dumps(obj, self.default).decode()
+
+    def response(self, *args, **kwargs):
+        """Serialize to an application/json response"""
+        if self._pretty():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            serializer.dumps(obj, self.default) + b"\n",
+            mimetype=self.mimetype)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Module for the on-demand stack sampling profiler"""
+import sys
+import threading
+from collections import Counter
+from time import monotonic, sleep
+from typing import Dict, Tuple
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is already running in this process"""
+
+
+class StackSampler:
+    """Samples the stacks of every thread of the process.
+
+    A profile runs in its own daemon thread, started by start() and read
+    back from result once done, so the worker that armed it keeps
+    serving requests meanwhile, sync gunicorn workers included. Each
+    tick reads sys._current_frames(), so the profiled threads are never
+    paused or traced: the cost is paid by the sampling thread only,
+    proportional to the sampling rate and to the stack depths. One
+    profile runs at a time per process, every gunicorn worker profiles
+    its own threads and keeps its own result.
+    """
+
+    def __init__(self):
+        """Initialize the sampler lock"""
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._done.set()
+        self.deadline = None
+        self.result = None
+
+    def start(self, seconds: float, interval: float,
+              per_thread: bool = False):
+        """Start sampling for some seconds in a sampler thread. Once done
+        result holds (stacks, ticks, seconds): stacks are tuples of
+        frames, root first, prefixed with the thread name if per_thread.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        self._done.clear()
+        self.deadline = monotonic() + seconds
+        try:
+            threading.Thread(target=self._run, name='profiler-sampler',
+                             args=(seconds, interval, per_thread),
+                             daemon=True).start()
+        except Exception:
+            self._finish()
+            raise
+
+    def running(self) -> bool:
+        """Whether a profile is being sampled"""
+        return not self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait until the running profile is done, False on timeout"""
+        return self._done.wait(timeout)
+
+    def _run(self, seconds: float, interval: float, per_thread: bool):
+        """Body of the sampler thread"""
+        try:
+            stacks, ticks = self._sample(seconds, interval, per_thread)
+            self.result = (stacks, ticks, seconds)
+        finally:
+            self._finish()
+
+    def _finish(self):
+        """Let the next profile start"""
+        self._done.set()
+        self._lock.release()
+
+    def _sample(self, seconds: float, interval: float,
+                per_thread: bool) -> Tuple[Counter, int]:
+        """Sampling loop, every thread but the calling one"""
+        own_ident = threading.get_ident()
+        stacks = Counter()
+        names: Dict[int, str] = {}
+        ticks = 0
+        deadline = monotonic() + seconds
+        while monotonic() < deadline:
+            frames = sys._current_frames()
+            if per_thread and not names.keys() >= frames.keys():
+                names = {thread.ident: thread.name
+                         for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("{} ({}:{})".format(
+                        code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                if per_thread:
+                    stack.append(names.get(ident, str(ident)))
+                stacks[tuple(reversed(stack))] += 1
+            ticks += 1
+            sleep(interval)
+        return stacks, ticks
+
+
+def collapsed(stacks: Counter) -> str:
+    """Stacks in the collapsed format read by flamegraph.pl"""
+    return "".join("{} {}\n".format(";".join(stack), count)
+                   for stack, count in stacks.most_common())
+
+
+def flame_tree(stacks: Counter) -> dict:
+    """Stacks as a nested {name, value, children} flame graph tree"""
+    root = {"name": "root", "value": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["value"] += count
+        node = root
+        for frame in stack:
+            child = node["children"].get(frame)
+            if child is None:
+                child = {"name": frame, "value": 0, "children": {}}
+                node["children"][frame] = child
+            child["value"] += count
+            node = child
+
+    def listed(node: dict) -> dict:
+        """Turn the children dicts into lists"""
+        node["children"] = [listed(child)
+                            for child in node["children"].values()]
+        return node
+    return listed(root)
+
+
+sampler = StackSampler()
@@ -2,11 +2,16 @@
 """ DocDocDocDocDocDoc
 """
 from flask import Blueprint
+from os import getenv
+from models.loader import StoreLoader
+from models.user import User
 
 app_views = Blueprint("app_views", __name__, url_prefix="/api/v1")
 
 from api.v1.views.index import *
 from api.v1.views.users import *
 from api.v1.views.session_auth import *
+from api.v1.views.changes import *  # noqa: E402
 
-User.load_from_file()
+store_loader = StoreLoader([User], getenv('STORE_LOAD') == 'shared')
+store_loader.start(getenv('STORE_LOAD') == 'background')
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Module of Changes views
+"""
+from api.v1.views import app_views
+from flask import abort, jsonify, request
+from models.changes import feed
+import os
+
+
+@app_views.route('/changes', methods=['GET'], strict_slashes=False)
+def changes() -> str:
+    """ GET /api/v1/changes
+    Query parameters:
+      - since: last sequence number already applied, default 0
+      - limit: maximum number of changes, default 100, at most 1000
+      - wait: seconds to hold the request while there is no change
+        after since (long poll), at most CHANGES_MAX_WAIT (5 by
+        default); ignored by a worker serving one request at a time,
+        which the long poll would hold
+      - epoch: epoch of since, from a previous answer
+      - consumer: name of the consumer, its unread changes are spilled
+        to disk instead of being dropped; a consumer that doesn't read
+        for CHANGES_CONSUMER_TTL seconds is forgotten
+    The feed only sees the writes of the worker serving the request:
+    run the API as a single process when it has consumers.
+    Return:
+      - epoch, last_seq, reset and the list of changes; reset is true
+        when since is no longer available, the consumer should then
+        resync from the full store
+      - 400 on invalid parameters
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        wait = min(float(request.args.get('wait', 0)),
+                   float(os.getenv('CHANGES_MAX_WAIT', 5)))
+    except ValueError:
+        return jsonify({'error': "since, limit and wait must be numbers"}), 400
+    if since < 0 or limit < 1:
+        return jsonify({'error': "since must be >= 0 and limit >= 1"}), 400
+
+    if not request.environ.get('wsgi.multithread'):
+        wait = 0
+
+    epoch = request.args.get('epoch')
+    if wait > 0 and (epoch is None or epoch == feed.epoch):
+        feed.wait(since, wait)
+    return jsonify(feed.changes(since, limit, epoch,
+                                request.args.get('consumer')))
+
+
+@app_views.route('/changes/consumers/<consumer>', methods=['DELETE'],
+                 strict_slashes=False)
+def forget_consumer(consumer: str = None) -> str:
+    """ DELETE /api/v1/changes/consumers/:consumer
+    Unregister a consumer so that its unread changes are no longer kept
+    Return:
+      - empty JSON, the spill file is removed if nobody else needs it
+      - 404 if the consumer isn't registered in this worker
+    """
+    if not feed.forget(consumer):
+        abort(404)
+    return jsonify({}), 200
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import jsonify, abort, request, Response
 from api.v1.views import app_views
+from api.v1.instrumentation import instrumentation
+from api.v1.profiler import ProfilerBusy, collapsed, flame_tree, sampler
+from models.stats import stats as store_stats
+from time import monotonic
+import os
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
@@ -18,12 +23,92 @@ def status() -> str:
 def stats() -> str:
     """ GET /api/v1/stats
     Return:
-      - the number of each objects
+      - the number of each objects and the signups per day, from a
+        snapshot rebuilt only when the store changes
+      - 304 if If-None-Match holds the snapshot ETag
     """
-    from models.user import User
-    stats = {}
-    stats['users'] = User.count()
-    return jsonify(stats)
+    body, etag = store_stats.snapshot()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics() -> str:
+    """ GET /api/v1/metrics
+    Return:
+      - latency quantiles per route and stage, Prometheus text format
+    """
+    return Response(instrumentation.metrics.render(),
+                    mimetype='text/plain; version=0.0.4')
+
+
+@app_views.route('/profiler', methods=['POST'], strict_slashes=False)
+def start_profiler() -> str:
+    """ POST /api/v1/profiler
+    Only served when PROFILER_ENABLED is set, behind the API auth.
+    Starts sampling in a background thread of the worker that handles
+    the request, which keeps serving meanwhile; fetch the result from
+    GET /api/v1/profiler once done. Every worker keeps its own profile.
+    Query parameters:
+      - seconds: sampling duration, default 5, at most PROFILER_MAX_SECONDS
+      - interval: milliseconds between samples, default 5
+      - threads: 1 to split the stacks per thread name
+    Return:
+      - 202 with the sampling duration and the worker pid
+      - 400 on invalid parameters
+      - 404 if the profiler is not enabled
+      - 409 if a profile is already running in this worker
+    """
+    if not os.getenv('PROFILER_ENABLED'):
+        abort(404)
+    try:
+        seconds = float(request.args.get('seconds', 5))
+        interval = float(request.args.get('interval', 5)) / 1000
+    except ValueError:
+        return jsonify({'error': "seconds and interval must be numbers"}), 400
+    max_seconds = float(os.getenv('PROFILER_MAX_SECONDS', 30))
+    if not 0 < seconds <= max_seconds or interval < 0.001:
+        return jsonify({'error': "seconds must be in ]0, {}] and interval "
+                        "at least 1 ms".format(max_seconds)}), 400
+
+    try:
+        sampler.start(seconds, interval, request.args.get('threads') == '1')
+    except ProfilerBusy:
+        return jsonify({'error': "A profile is already running",
+                        'pid': os.getpid()}), 409
+    return jsonify({"seconds": seconds, "pid": os.getpid()}), 202
+
+
+@app_views.route('/profiler', methods=['GET'], strict_slashes=False)
+def profiler() -> str:
+    """ GET /api/v1/profiler
+    Only served when PROFILER_ENABLED is set, behind the API auth.
+    Query parameters:
+      - format: collapsed (default) or json
+    Return:
+      - the last profile of this worker: collapsed stacks for
+        flamegraph.pl, or a JSON flame graph tree
+      - 202 with the remaining seconds while a profile is running
+      - 404 if the profiler is not enabled or this worker has no profile
+    """
+    if not os.getenv('PROFILER_ENABLED'):
+        abort(404)
+    if sampler.running():
+        remaining = max(0.0, sampler.deadline - monotonic())
+        return jsonify({"remaining": round(remaining, 3),
+                        "pid": os.getpid()}), 202
+    if sampler.result is None:
+        return jsonify({'error': "No profile in this worker",
+                        'pid': os.getpid()}), 404
+
+    stacks, ticks, seconds = sampler.result
+    if request.args.get('format') == 'json':
+        return jsonify({"seconds": seconds, "samples": ticks,
+                        "pid": os.getpid(), "tree": flame_tree(stacks)})
+    return Response(collapsed(stacks), mimetype='text/plain')
+
 
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
 def unauthorized() -> str:
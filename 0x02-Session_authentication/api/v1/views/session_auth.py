@@ -3,7 +3,6 @@
 from flask import jsonify, request, abort
 from api.v1.views import app_views
 from models.user import User
-import os
 
 
 @app_views.route('/auth_session/login', methods=['POST'], strict_slashes=False)
@@ -35,7 +34,7 @@ def login():
     if not session_id:
         return abort(500, description="Session creation failed")
 
-    session_name = os.getenv('SESSION_NAME')
+    session_name = auth.session_name
 
     user_data = user.to_json()
     response = jsonify(user_data)
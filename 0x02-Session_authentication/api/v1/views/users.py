@@ -2,20 +2,39 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, jsonify, request, Response
+from werkzeug.http import is_resource_modified
+from models.serializer import dumps_list
 from models.user import User
 
 
+def conditional_user(user: User) -> Response:
+    """ JSON of a user with its ETag and Last-Modified, or an empty 304
+    without serializing if the client copy is still current
+    """
+    if is_resource_modified(request.environ, etag=user.etag(),
+                            last_modified=user.updated_at):
+        response = Response(user.to_json_bytes() + b"\n",
+                            mimetype='application/json')
+    else:
+        response = Response(status=304)
+    response.set_etag(user.etag())
+    response.last_modified = user.updated_at
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @app_views.route('/users/me', methods=['GET'], strict_slashes=False)
 def get_current_user() -> str:
     """ GET /api/v1/users/me
     Return:
       - Authenticated User object JSON represented
+      - 304 if If-None-Match or If-Modified-Since match
       - 404 if no authenticated user
     """
     if request.current_user is None:
         abort(404)
-    return jsonify(request.current_user.to_json())
+    return conditional_user(request.current_user)
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
@@ -24,8 +43,8 @@ def view_all_users() -> str:
     Return:
       - list of all User objects JSON represented
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    body = dumps_list(user.to_json_bytes() for user in User.all())
+    return Response(body + b"\n", mimetype='application/json')
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -35,12 +54,13 @@ def view_one_user(user_id: str = None) -> str:
       - User ID
     Return:
       - User object JSON represented
+      - 304 if If-None-Match or If-Modified-Since match
       - 404 if the User ID doesn't exist
     """
     if user_id is "me":
         if request.current_user is None:
             abort(404)
-        return jsonify(request.current_user.to_json())
+        return conditional_user(request.current_user)
 
     if user_id is None:
         abort(404)
@@ -49,7 +69,7 @@ def view_one_user(user_id: str = None) -> str:
 
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return conditional_user(user)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+""" Microbenchmarks of the API authentication path
+
+Usage: ./bench_auth.py [sizes] [repeat]
+  sizes   comma separated user counts, default 1000,10000,100000
+  repeat  calls timed per stage, default 200
+
+Seeds N users straight into the Base store, then times each stage of
+before_request_handler -> require_auth -> current_user (Basic and
+Session) -> User.search/User.get, and the /users, /users/<id> and
+/stats endpoints through the Flask test client. Prints JSON.
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+os.chdir(tempfile.mkdtemp())
+os.environ["AUTH_TYPE"] = "chain_auth"
+os.environ["AUTH_CHAIN"] = "session_auth,basic_auth"
+os.environ["SESSION_NAME"] = "_my_session_id"
+
+from api.v1.app import app, auth, excluded_paths_matcher  # noqa: E402
+from api.v1.auth.auth import AuthContext  # noqa: E402
+from models.base import DATA  # noqa: E402
+from models.user import User  # noqa: E402
+
+LIST_MAX = int(os.getenv("BENCH_LIST_MAX", 100000))
+PASSWORD = "bench-pwd"
+
+
+class FakeRequest:
+    """ Minimal request object for the auth methods
+    """
+
+    def __init__(self, headers: dict = None, cookies: dict = None):
+        """ Initialize with headers and cookies
+        """
+        self.headers = headers or {}
+        self.cookies = cookies or {}
+
+
+def seed(start: int, stop: int):
+    """ Add users start..stop-1 to the store, return the last one
+    """
+    hashed = User.hashers[User.default_hasher].encode(PASSWORD)
+    users = DATA["User"]
+    user = None
+    for i in range(start, stop):
+        user = User(email="user{}@bench.io".format(i), _password=hashed,
+                    id=str(uuid.UUID(int=i)))
+        users[user.id] = user
+    return user
+
+
+def measure(function, repeat: int) -> dict:
+    """ Time repeated calls of a function, in microseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        "calls": repeat,
+        "mean_us": round(sum(timings) / repeat, 2),
+        "p50_us": round(timings[repeat // 2], 2),
+        "p95_us": round(timings[min(repeat - 1, int(repeat * 0.95))], 2),
+    }
+
+
+def checked(response):
+    """ Fail loudly if an endpoint did not answer 200
+    """
+    if response.status_code != 200:
+        raise RuntimeError("{} {}".format(response.status_code,
+                                          response.get_data(as_text=True)))
+    return response
+
+
+def bench_size(user: User, repeat: int, size: int) -> dict:
+    """ Time every stage for the current store
+    """
+    basic = auth.schemes[1]
+    session = auth.schemes[0]
+    credentials = "{}:{}".format(user.email, PASSWORD)
+    header = "Basic " + base64.b64encode(credentials.encode()).decode()
+    session_id = session.create_session(user.id)
+    session_request = FakeRequest(cookies={"_my_session_id": session_id})
+    client = app.test_client()
+    session_client = app.test_client()
+    session_client.set_cookie("_my_session_id", session_id)
+
+    stages = {
+        "require_auth": lambda: excluded_paths_matcher._require_auth(
+            "/api/v1/users/{}".format(uuid.uuid4().hex)),
+        "auth_context": lambda: AuthContext(session_request,
+                                            "_my_session_id"),
+        "basic.parse_header": lambda: basic.extract_user_credentials(
+            basic.decode_base64_authorization_header(
+                basic.extract_base64_authorization_header(header))),
+        "basic.current_user": lambda: basic.current_user(
+            FakeRequest(headers={"Authorization": header})),
+        "session.current_user": lambda: session.current_user(
+            FakeRequest(cookies={"_my_session_id": session_id})),
+        "user.is_valid_password": lambda: user.is_valid_password(PASSWORD),
+        "User.search": lambda: User.search({"email": user.email}),
+        "User.get": lambda: User.get(user.id),
+        "GET /users/<id> (session)": lambda: checked(session_client.get(
+            "/api/v1/users/{}".format(user.id))),
+        "GET /users/<id> (basic)": lambda: checked(client.get(
+            "/api/v1/users/{}".format(user.id),
+            headers={"Authorization": header})),
+        "GET /stats": lambda: checked(client.get(
+            "/api/v1/stats", headers={"Authorization": header})),
+    }
+    if size <= LIST_MAX:
+        stages["GET /users"] = lambda: checked(session_client.get(
+            "/api/v1/users"))
+
+    results = {}
+    for name, function in stages.items():
+        calls = 5 if name == "GET /users" else repeat
+        results[name] = measure(function, calls)
+    return results
+
+
+if __name__ == "__main__":
+    sizes = [1000, 10000, 100000]
+    if len(sys.argv) > 1:
+        sizes = [int(size) for size in sys.argv[1].split(",")]
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    seeded = 0
+    report = []
+    for size in sorted(set(sizes)):
+        user = seed(seeded, size)
+        seeded = size
+        report.append({"users": size,
+                       "stages": bench_size(user, repeat, size)})
+    print(json.dumps({"benchmark": "auth request path", "results": report},
+                     indent=2))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+""" Cold start benchmark and import-time budget of api.v1.app
+
+Usage: ./bench_startup.py [users]
+  users   size of the generated store, default 100000
+
+Runs each measurement in a fresh interpreter:
+  - `python -X importtime` of api.v1.app, the time spent in the api and
+    models modules is checked against IMPORT_BUDGET_MS (default 50)
+  - time to the first /api/v1/status answer and to a loaded store, with
+    the store loaded at import and with STORE_LOAD=background
+Prints JSON, exits 1 if the import budget is exceeded.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", 50))
+OWN_PACKAGES = ("api", "models")
+
+COLD_START = """
+import json, time
+start = time.perf_counter()
+from api.v1.app import app
+from api.v1.views import store_loader
+imported = time.perf_counter()
+status = app.test_client().get('/api/v1/status').status_code
+answered = time.perf_counter()
+store_loader.wait()
+ready = time.perf_counter()
+print(json.dumps({"status": status,
+                  "import_ms": round((imported - start) * 1000, 1),
+                  "first_status_ms": round((answered - start) * 1000, 1),
+                  "store_ready_ms": round((ready - start) * 1000, 1)}))
+"""
+
+
+def run(code: str, cwd: str, env: dict, *flags: str):
+    """ Run python code in a fresh interpreter, return stdout, stderr
+    """
+    env = dict(os.environ, PYTHONPATH=HERE, **env)
+    process = subprocess.run([sys.executable, *flags, "-c", code], cwd=cwd,
+                             env=env, capture_output=True, text=True,
+                             check=True)
+    return process.stdout, process.stderr
+
+
+def import_times(cwd: str) -> dict:
+    """ Parse `-X importtime` of api.v1.app
+    """
+    _, stderr = run("import api.v1.app", cwd, {}, "-X", "importtime")
+    own = []
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue
+        name = fields[2].strip()
+        if name == "api.v1.app":
+            total = cumulative_us
+        if name.split(".")[0] in OWN_PACKAGES:
+            own.append((self_us, name))
+    own.sort(reverse=True)
+    own_ms = sum(self_us for self_us, _ in own) / 1000
+    return {
+        "total_ms": round(total / 1000, 1),
+        "own_modules_ms": round(own_ms, 1),
+        "budget_ms": IMPORT_BUDGET_MS,
+        "within_budget": own_ms <= IMPORT_BUDGET_MS,
+        "slowest_own_modules": [{"module": name,
+                                 "self_ms": round(self_us / 1000, 2)}
+                                for self_us, name in own[:10]],
+    }
+
+
+def write_store(directory: str, users: int):
+    """ Write a .db_User.json of generated users
+    """
+    objs = {}
+    for i in range(users):
+        user_id = str(uuid.UUID(int=i))
+        objs[user_id] = {"id": user_id, "created_at": "2024-01-01T00:00:00",
+                         "updated_at": "2024-01-01T00:00:00",
+                         "email": "user{}@bench.io".format(i),
+                         "_password": None, "first_name": None,
+                         "last_name": None}
+    with open(os.path.join(directory, ".db_User.json"), "w") as f:
+        json.dump(objs, f)
+
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as empty:
+        imports = import_times(empty)
+    with tempfile.TemporaryDirectory() as directory:
+        write_store(directory, users)
+        cold_start = {}
+        for mode in ("import", "background"):
+            stdout, _ = run(COLD_START, directory, {"STORE_LOAD": mode})
+            cold_start[mode] = json.loads(stdout)
+    print(json.dumps({"users": users, "imports": imports,
+                      "cold_start": cold_start}, indent=2))
+    sys.exit(0 if imports["within_budget"] else 1)
@@ -2,19 +2,30 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import Callable, TypeVar, List, Iterable
+from os import getenv, path
+from models import serializer
 import json
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+LISTENERS = []
+
+
+def notify(event: str, obj) -> None:
+    """ Call the store listeners: event is create, update or remove with
+    the object, or load with the class whose objects were reloaded
+    """
+    for listener in LISTENERS:
+        listener(event, obj)
 
 
 class Base():
     """ Base class
     """
+    json_cache = getenv('JSON_CACHE', '1') != '0'
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
@@ -34,6 +45,13 @@ class Base():
                                                 TIMESTAMP_FORMAT)
         else:
             self.updated_at = datetime.utcnow()
+        self._version = int(kwargs.get('_version', 0))
+
+    def __setattr__(self, name: str, value):
+        """ Set an attribute, dropping the cached JSON of the object
+        """
+        self.__dict__.pop('_json', None)
+        super().__setattr__(name, value)
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
@@ -49,6 +67,8 @@ class Base():
         """
         result = {}
         for key, value in self.__dict__.items():
+            if key == '_json':
+                continue
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,20 +77,38 @@ class Base():
                 result[key] = value
         return result
 
+    def to_json_bytes(self) -> bytes:
+        """ Encoded to_json(), cached on the object until an attribute
+        is assigned
+        """
+        encoded = self.__dict__.get('_json')
+        if encoded is None:
+            encoded = serializer.dumps(self.to_json())
+            if self.json_cache:
+                self.__dict__['_json'] = encoded
+        return encoded
+
+    def etag(self) -> str:
+        """ Validator of the saved state, changes on every save
+        """
+        return "{}-{}".format(self.id, self._version)
+
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    def load_from_file(cls, shared: bool = False):
+        """ Load all objects from file, into a SharedStore if shared
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
         DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        if shared:
+            from models.shared_store import SharedStore
+            DATA[s_class] = SharedStore.from_file(cls, file_path)
+        elif path.exists(file_path):
+            with open(file_path, 'r') as f:
+                objs_json = json.load(f)
+                for obj_id, obj_json in objs_json.items():
+                    DATA[s_class][obj_id] = cls(**obj_json)
+        notify('load', cls)
 
     @classmethod
     def save_to_file(cls):
@@ -78,6 +116,9 @@ class Base():
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
+        if hasattr(DATA[s_class], 'persist'):
+            DATA[s_class].persist(file_path)
+            return
         objs_json = {}
         for obj_id, obj in DATA[s_class].items():
             objs_json[obj_id] = obj.to_json(True)
@@ -90,8 +131,11 @@ class Base():
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
+        self._version += 1
+        created = DATA[s_class].get(self.id) is None
         DATA[s_class][self.id] = self
         self.__class__.save_to_file()
+        notify('create' if created else 'update', self)
 
     def remove(self):
         """ Remove object
@@ -100,6 +144,13 @@ class Base():
         if DATA[s_class].get(self.id) is not None:
             del DATA[s_class][self.id]
             self.__class__.save_to_file()
+            notify('remove', self)
+
+    @staticmethod
+    def listen(listener: Callable) -> None:
+        """ Register a listener(event, obj) of the store changes
+        """
+        LISTENERS.append(listener)
 
     @classmethod
     def count(cls) -> int:
@@ -134,4 +185,9 @@ class Base():
                     return False
             return True
         
-        return list(filter(_search, DATA[s_class].values()))
+        objs = DATA[s_class]
+        if attributes and hasattr(objs, 'lookup'):
+            candidates = objs.lookup(attributes)
+            if candidates is not None:
+                return list(filter(_search, candidates))
+        return list(filter(_search, objs.values()))
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+""" Changes module: change-data feed of the store
+"""
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from os import getenv
+from time import monotonic
+from typing import List
+import atexit
+import json
+import os
+import threading
+import uuid
+
+from models.base import Base, TIMESTAMP_FORMAT
+
+
+class ChangeFeed():
+    """ Sequence of the store changes, for incremental downstream sync.
+
+    Every create, update, remove and load gets the next sequence number
+    and goes to a bounded in-memory ring. Changes evicted from the ring
+    while a registered consumer hasn't read them are appended to a spill
+    file instead of being lost; when nobody lags the spill is dropped.
+
+    The feed is single-worker only: it records the writes of its own
+    process, so with several workers each one serves a different partial
+    feed. Sequence numbers are only monotonic within an epoch, which is
+    new for every process, forked workers included: a consumer whose
+    epoch or position is no longer available gets reset and should
+    resync from the full store. Each process spills to its own
+    <spill_path>.<pid>, removed once no consumer needs it and when the
+    process exits.
+
+    A consumer that hasn't read for consumer_ttl seconds is forgotten, so
+    an abandoned one doesn't keep changes spilling until the size cap.
+    """
+    SPILL_INDEX_EVERY = 256
+
+    def __init__(self, ring_size: int = 10000, spill_path: str = None,
+                 spill_max_bytes: int = 100 * 1024 * 1024,
+                 consumer_ttl: float = 300):
+        """ Initialize an empty feed with a new epoch
+        """
+        self.epoch = uuid.uuid4().hex
+        self.ring_size = ring_size
+        self.consumer_ttl = consumer_ttl
+        self.last_seq = 0
+        self._ring = deque()
+        self._cond = threading.Condition()
+        self._consumers = {}
+        self._spill_path = spill_path
+        self._spill_max_bytes = spill_max_bytes
+        self._spill_first = None
+        self._spill_index = []
+        self._spill_size = 0
+        self._spill = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """ Start a new epoch in a forked worker, without the parent's
+        spill and consumers
+        """
+        self.epoch = uuid.uuid4().hex
+        self._cond = threading.Condition()
+        self._consumers = {}
+        self._spill = None
+        self._spill_first = None
+        self._spill_index = []
+        self._spill_size = 0
+
+    def record(self, event: str, obj):
+        """ Store listener: append a change
+        """
+        change = {"op": event, "at": datetime.utcnow().strftime(
+            TIMESTAMP_FORMAT)}
+        if event == 'load':
+            change["class"] = obj.__name__
+        else:
+            change["class"] = obj.__class__.__name__
+            change["id"] = obj.id
+            if event != 'remove':
+                change["object"] = obj.to_json()
+        with self._cond:
+            self.last_seq += 1
+            change["seq"] = self.last_seq
+            self._ring.append(change)
+            if len(self._ring) > self.ring_size:
+                self._evict(self._ring.popleft())
+            self._cond.notify_all()
+
+    def _expire_consumers(self):
+        """ Forget the consumers that stopped reading, called with the
+        lock held
+        """
+        deadline = monotonic() - self.consumer_ttl
+        for consumer, (_, seen) in list(self._consumers.items()):
+            if seen < deadline:
+                del self._consumers[consumer]
+
+    def _lagging(self, seq: int) -> bool:
+        """ Whether a consumer hasn't read a change yet
+        """
+        self._expire_consumers()
+        return any(position < seq
+                   for position, _ in self._consumers.values())
+
+    def _evict(self, change: dict):
+        """ Spill an evicted change if a consumer still needs it, called
+        with the lock held
+        """
+        if self._spill_path is None or not self._lagging(change["seq"]) or \
+                self._spill_size >= self._spill_max_bytes:
+            self._drop_spill()
+            return
+        if self._spill is None:
+            self._spill = open(self._spill_file(), 'wb')
+        line = (json.dumps(change) + "\n").encode()
+        if self._spill_first is None:
+            self._spill_first = change["seq"]
+        if (change["seq"] - self._spill_first) % \
+                self.SPILL_INDEX_EVERY == 0:
+            self._spill_index.append((change["seq"], self._spill_size))
+        self._spill.write(line)
+        self._spill.flush()
+        self._spill_size += len(line)
+
+    def _spill_file(self) -> str:
+        """ Spill file of this process
+        """
+        return "{}.{}".format(self._spill_path, os.getpid())
+
+    def _drop_spill(self):
+        """ Remove the spill file, its changes are no longer available
+        """
+        if self._spill is None:
+            return
+        self._spill.close()
+        try:
+            os.unlink(self._spill_file())
+        except FileNotFoundError:
+            pass
+        self._spill = None
+        self._spill_first = None
+        self._spill_index = []
+        self._spill_size = 0
+
+    def _oldest_seq(self) -> int:
+        """ Sequence number of the oldest available change
+        """
+        if self._spill_first is not None:
+            return self._spill_first
+        if self._ring:
+            return self._ring[0]["seq"]
+        return self.last_seq + 1
+
+    def _read_spill(self, since: int, limit: int) -> List[dict]:
+        """ Spilled changes after since, called with the lock held
+        """
+        seqs = [seq for seq, _ in self._spill_index]
+        _, offset = self._spill_index[max(0, bisect_right(seqs, since) - 1)]
+        changes = []
+        with open(self._spill_file(), 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                change = json.loads(line)
+                if change["seq"] > since:
+                    changes.append(change)
+                    if len(changes) >= limit:
+                        break
+        return changes
+
+    def changes(self, since: int, limit: int = 100, epoch: str = None,
+                consumer: str = None) -> dict:
+        """ At most limit changes after since, in sequence order.
+        A named consumer reading after since acknowledges everything up
+        to since, so the feed knows what it can drop.
+        """
+        with self._cond:
+            if consumer:
+                self._consumers[consumer] = (since, monotonic())
+            reset = (epoch is not None and epoch != self.epoch) or \
+                since > self.last_seq or \
+                (since < self.last_seq and since + 1 < self._oldest_seq())
+            if reset:
+                return {"epoch": self.epoch, "reset": True, "changes": [],
+                        "last_seq": self.last_seq}
+            changes = []
+            if self._spill_first is not None and \
+                    (not self._ring or since + 1 < self._ring[0]["seq"]):
+                changes = self._read_spill(since, limit)
+                if changes:
+                    since = changes[-1]["seq"]
+            if self._ring:
+                start = max(0, since + 1 - self._ring[0]["seq"])
+                changes.extend(islice(self._ring, start,
+                                      start + limit - len(changes)))
+            return {"epoch": self.epoch, "reset": False, "changes": changes,
+                    "last_seq": self.last_seq}
+
+    def wait(self, since: int, timeout: float) -> bool:
+        """ Wait until a change after since is recorded, False on timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self.last_seq > since,
+                                       timeout)
+
+    def forget(self, consumer: str) -> bool:
+        """ Unregister a consumer so that it no longer holds the spill,
+        False if it wasn't registered
+        """
+        with self._cond:
+            forgotten = self._consumers.pop(consumer, None) is not None
+            ring_first = self._ring[0]["seq"] if self._ring else \
+                self.last_seq + 1
+            if not self._lagging(ring_first - 1):
+                self._drop_spill()
+            return forgotten
+
+    def close(self):
+        """ Remove the spill file of this process, at exit
+        """
+        with self._cond:
+            self._drop_spill()
+
+
+feed = ChangeFeed(int(getenv('CHANGES_RING_SIZE', 10000)),
+                  getenv('CHANGES_SPILL_FILE', '.changes_spill.jsonl'),
+                  int(getenv('CHANGES_SPILL_MAX_BYTES', 100 * 1024 * 1024)),
+                  float(getenv('CHANGES_CONSUMER_TTL', 300)))
+Base.listen(feed.record)
+atexit.register(feed.close)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+""" Password hashers module
+"""
+import base64
+import hashlib
+import hmac
+import os
+
+
+def _b64(data: bytes) -> str:
+    """ Base64 encode without padding
+    """
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(data: str) -> bytes:
+    """ Reverse of _b64
+    """
+    return base64.b64decode(data + '=' * (-len(data) % 4))
+
+
+class Hasher():
+    """ Base class of the password hashers
+
+    Encoded hashes are prefixed with `<name>$` so the stored value says
+    which hasher produced it. strength ranks the hashers: a stored hash
+    is only re-encoded toward a stronger one.
+    """
+    name = None
+    strength = 0
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password
+        """
+        raise NotImplementedError
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against an encoded hash
+        """
+        raise NotImplementedError
+
+    def needs_update(self, encoded: str) -> bool:
+        """ True if the hash was made with outdated parameters
+        """
+        return False
+
+
+class Sha256Hasher(Hasher):
+    """ Legacy unsalted SHA256, stored as bare lowercase hex
+    """
+    name = 'sha256'
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password
+        """
+        return hashlib.sha256(pwd.encode()).hexdigest().lower()
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against an encoded hash
+        """
+        return hmac.compare_digest(self.encode(pwd), encoded)
+
+
+class Pbkdf2Hasher(Hasher):
+    """ PBKDF2-HMAC-SHA256: `pbkdf2_sha256$<iterations>$<salt>$<hash>`
+    """
+    name = 'pbkdf2_sha256'
+    strength = 1
+    iterations = int(os.getenv('PBKDF2_ITERATIONS', 600000))
+
+    def encode(self, pwd: str, salt: bytes = None,
+               iterations: int = None) -> str:
+        """ Hash a password
+        """
+        salt = salt or os.urandom(16)
+        iterations = iterations or self.iterations
+        digest = hashlib.pbkdf2_hmac('sha256', pwd.encode(), salt, iterations)
+        return "{}${}${}${}".format(self.name, iterations,
+                                    _b64(salt), _b64(digest))
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against an encoded hash
+        """
+        try:
+            _, iterations, salt, _ = encoded.split('$')
+            expected = self.encode(pwd, _unb64(salt), int(iterations))
+        except ValueError:
+            return False
+        return hmac.compare_digest(expected, encoded)
+
+    def needs_update(self, encoded: str) -> bool:
+        """ True if the hash was made with another iteration count
+        """
+        return encoded.split('$')[1] != str(self.iterations)
+
+
+class ScryptHasher(Hasher):
+    """ scrypt: `scrypt$<n>$<r>$<p>$<salt>$<hash>`
+    """
+    name = 'scrypt'
+    strength = 3
+    n = 2 ** 14
+    r = 8
+    p = 1
+
+    def encode(self, pwd: str, salt: bytes = None, n: int = None,
+               r: int = None, p: int = None) -> str:
+        """ Hash a password
+        """
+        salt = salt or os.urandom(16)
+        n, r, p = n or self.n, r or self.r, p or self.p
+        digest = hashlib.scrypt(pwd.encode(), salt=salt, n=n, r=r, p=p,
+                                dklen=32)
+        return "{}${}${}${}${}${}".format(self.name, n, r, p,
+                                          _b64(salt), _b64(digest))
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against an encoded hash
+        """
+        try:
+            _, n, r, p, salt, _ = encoded.split('$')
+            expected = self.encode(pwd, _unb64(salt), int(n), int(r), int(p))
+        except ValueError:
+            return False
+        return hmac.compare_digest(expected, encoded)
+
+    def needs_update(self, encoded: str) -> bool:
+        """ True if the hash was made with other cost parameters
+        """
+        return encoded.split('$')[1:4] != [str(self.n), str(self.r),
+                                           str(self.p)]
+
+
+class BcryptHasher(Hasher):
+    """ bcrypt: `bcrypt$<bcrypt hash>`, needs the bcrypt package
+    """
+    name = 'bcrypt'
+    strength = 2
+    rounds = int(os.getenv('BCRYPT_ROUNDS', 12))
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password
+        """
+        import bcrypt
+        hashed = bcrypt.hashpw(pwd.encode(), bcrypt.gensalt(self.rounds))
+        return "{}${}".format(self.name, hashed.decode('ascii'))
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against an encoded hash
+        """
+        import bcrypt
+        try:
+            hashed = encoded.split('$', 1)[1].encode('ascii')
+            return bcrypt.checkpw(pwd.encode(), hashed)
+        except ValueError:
+            return False
+
+    def needs_update(self, encoded: str) -> bool:
+        """ True if the hash was made with another number of rounds
+        """
+        return encoded.split('$')[3] != "{:02d}".format(self.rounds)
+
+
+def hasher_name(encoded: str) -> str:
+    """ Name of the hasher that produced an encoded hash
+    """
+    if '$' not in encoded:
+        return Sha256Hasher.name
+    return encoded.split('$', 1)[0]
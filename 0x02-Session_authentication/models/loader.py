@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+""" Loader module: loads the file store, optionally in the background
+"""
+from threading import Event, Thread
+from typing import Iterable
+import gc
+
+
+class StoreLoader():
+    """ Loads the objects of some classes from their files and tells
+    when they are ready, so that a server can start answering before a
+    large store is parsed
+    """
+
+    def __init__(self, classes: Iterable[type], shared: bool = False):
+        """ Initialize the loader of the classes, into SharedStores if
+        shared
+        """
+        self.classes = list(classes)
+        self.shared = shared
+        self.ready = Event()
+        self.error = None
+
+    def load(self):
+        """ Load every class, then open the readiness barrier. It opens
+        on failure too, with error set, so that nobody waits for a store
+        that will never be loaded
+        """
+        try:
+            for cls in self.classes:
+                cls.load_from_file(self.shared)
+            if self.shared:
+                # Keep the collector from writing to the pages shared
+                # with the forked workers
+                gc.collect()
+                gc.freeze()
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self.ready.set()
+
+    def start(self, background: bool = False):
+        """ Load now, or in a daemon thread if background
+        """
+        if not background:
+            self.load()
+            return
+        Thread(target=self.load, name='store-loader', daemon=True).start()
+
+    def loaded(self) -> bool:
+        """ Whether the store is loaded, without waiting
+        """
+        return self.ready.is_set() and self.error is None
+
+    def wait(self, timeout: float = None) -> bool:
+        """ Wait until the store is loaded, False on timeout or if the
+        load failed
+        """
+        return self.ready.wait(timeout) and self.error is None
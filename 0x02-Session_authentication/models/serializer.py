@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+""" Serializer module: JSON encoding backend of the models and the API
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj, default=None) -> bytes:
+    """ Compact JSON with sorted keys, as jsonify produces it: with
+    orjson when it is installed, else with the standard json module.
+    default converts the objects the encoder doesn't know.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default,
+                            option=orjson.OPT_SORT_KEYS |
+                            orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=default, sort_keys=True,
+                      separators=(',', ':')).encode()
+
+
+def loads(data: bytes):
+    """ Decode JSON, with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_list(fragments) -> bytes:
+    """ JSON array made of already encoded items
+    """
+    return b'[' + b','.join(fragments) + b']'
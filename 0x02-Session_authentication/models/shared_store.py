@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+""" Shared store module: compact read-only objects of a class, shared
+copy-on-write by preforked workers, with a per-worker write overlay
+"""
+from array import array
+from bisect import bisect_left
+from os import getenv, path
+from typing import Iterable, Iterator, List, Optional, Tuple
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from models import serializer
+
+WHITESPACE = re.compile(r'\s*')
+
+
+def iter_json_object(text: str) -> Iterator[Tuple[str, dict]]:
+    """ (key, value) pairs of a JSON object, decoded one value at a time
+    so that the whole object never has to be built in memory
+    """
+    decoder = json.JSONDecoder()
+    index = WHITESPACE.match(text).end()
+    if text[index:index + 1] != '{':
+        raise ValueError("Expected a JSON object")
+    index = WHITESPACE.match(text, index + 1).end()
+    while text[index:index + 1] != '}':
+        key, index = decoder.raw_decode(text, index)
+        index = WHITESPACE.match(text, index).end()
+        if text[index:index + 1] != ':':
+            raise ValueError("Expected ':' at {}".format(index))
+        index = WHITESPACE.match(text, index + 1).end()
+        value, index = decoder.raw_decode(text, index)
+        yield key, value
+        index = WHITESPACE.match(text, index).end()
+        if text[index:index + 1] == ',':
+            index = WHITESPACE.match(text, index + 1).end()
+
+
+class HashIndex():
+    """ Sorted array of 64-bit key hashes with their rows: 16 bytes per
+    entry and no Python object per key. Hashes may collide, so callers
+    check the decoded rows.
+    """
+
+    def __init__(self):
+        """ Initialize an empty index, add entries then sort it
+        """
+        self._hashes = array('Q')
+        self._rows = array('L')
+
+    def add(self, key: str, row: int):
+        """ Add the row of a key, call sort() once every row is added
+        """
+        self._hashes.append(hash(key) & 0xFFFFFFFFFFFFFFFF)
+        self._rows.append(row)
+
+    def sort(self):
+        """ Sort the entries by hash
+        """
+        order = sorted(range(len(self._hashes)),
+                       key=self._hashes.__getitem__)
+        self._hashes = array('Q', (self._hashes[i] for i in order))
+        self._rows = array('L', (self._rows[i] for i in order))
+
+    def rows(self, key: str) -> Iterator[int]:
+        """ Rows whose key has the same hash as key
+        """
+        key_hash = hash(key) & 0xFFFFFFFFFFFFFFFF
+        position = bisect_left(self._hashes, key_hash)
+        while position < len(self._hashes) and \
+                self._hashes[position] == key_hash:
+            yield self._rows[position]
+            position += 1
+
+
+class Snapshot():
+    """ Rows of a class as read from its file: one bytes blob of JSON
+    rows, an array of offsets and hash indexes on the id and on one
+    indexed attribute. Never modified once built.
+    """
+
+    def __init__(self, objs_json: Iterable[Tuple[str, dict]], indexed: str,
+                 file_key: tuple = None):
+        """ Build the blob, the offsets and the indexes from (id, JSON
+        dict) pairs. file_key identifies the file version it was read from
+        """
+        self.indexed = indexed
+        self.file_key = file_key
+        self._blob = bytearray()
+        self._offsets = array('Q', [0])
+        self._ids = HashIndex()
+        self._values = HashIndex()
+        for row, (obj_id, obj_json) in enumerate(objs_json):
+            self._blob += serializer.dumps(obj_json)
+            self._offsets.append(len(self._blob))
+            self._ids.add(obj_id, row)
+            if obj_json.get(indexed) is not None:
+                self._values.add(obj_json[indexed], row)
+        self._ids.sort()
+        self._values.sort()
+
+    def __len__(self) -> int:
+        """ Number of rows
+        """
+        return len(self._offsets) - 1
+
+    def decode(self, row: int) -> dict:
+        """ JSON dict of one row
+        """
+        return serializer.loads(
+            self._blob[self._offsets[row]:self._offsets[row + 1]])
+
+    def find(self, obj_id: str) -> Optional[dict]:
+        """ JSON dict of the row of an id, None if it has no row
+        """
+        for row in self._ids.rows(obj_id):
+            obj_json = self.decode(row)
+            if obj_json.get('id') == obj_id:
+                return obj_json
+        return None
+
+    def matching(self, value) -> Iterator[dict]:
+        """ JSON dicts of the rows whose indexed attribute is value
+        """
+        for row in self._values.rows(value):
+            obj_json = self.decode(row)
+            if obj_json.get(self.indexed) == value:
+                yield obj_json
+
+    def rows(self) -> Iterator[dict]:
+        """ JSON dicts of every row
+        """
+        for row in range(len(self)):
+            yield self.decode(row)
+
+
+def file_key(file_path: str) -> Optional[tuple]:
+    """ Identity of the current version of a file, None if it is missing.
+    Files are replaced atomically so a write changes the inode.
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class SharedStore():
+    """ Drop-in for the DATA[class] dict of one class.
+
+    The objects loaded from file are kept as a Snapshot instead of one
+    instance and one __dict__ per object. Built once in the master
+    (gunicorn --preload), none of it holds Python objects per row, so the
+    pages stay shared after fork: rows are only decoded into fresh
+    instances when read. The snapshot is never modified.
+
+    Writes of a worker go to its overlay (saved objects) and tombstones
+    (removed ids). Persisting merges them into the current file under a
+    lock, so workers never clobber each other's writes, and appends them
+    as one line to the <file>.log side file, which is also the lock. The
+    persisted writes stay in the overlay. Writes of other workers are
+    picked up by reading the new lines of the log at most every
+    REFRESH_INTERVAL seconds, at the cost of the changes only; a negative
+    interval disables the check.
+
+    Once the log grows past LOG_MAX_BYTES it is truncated, and when the
+    file was replaced by something else than a worker, the snapshot is
+    rebuilt from the file in a background thread and swapped in with
+    only the unpersisted writes left in the overlay. That snapshot is
+    private to the worker. The log can be deleted while no process
+    uses the store.
+    """
+    INDEXED = 'email'
+    REFRESH_INTERVAL = float(getenv('STORE_REFRESH_INTERVAL', 1))
+    LOG_MAX_BYTES = int(getenv('STORE_LOG_MAX_BYTES', 16 * 1024 * 1024))
+
+    def __init__(self, cls: type, objs_json: Iterable[Tuple[str, dict]],
+                 file_path: str = None, key: tuple = None,
+                 log_position: tuple = None):
+        """ Build the store of a class from (id, JSON dict) pairs, read
+        from file_path at version key and (generation, offset) of its log
+        """
+        self.cls = cls
+        self.file_path = file_path
+        self._snapshot = Snapshot(objs_json, self.INDEXED, key)
+        self._file_key = key
+        self._log_generation, self._log_offset = log_position or (None, 0)
+        self._overlay = {}
+        self._tombstones = set()
+        self._pending = set()
+        self._count = len(self._snapshot)
+        self._checked_at = time.monotonic()
+        self._refresh_lock = threading.Lock()
+        self._rebuild_thread = None
+
+    @classmethod
+    def from_file(cls, obj_class: type, file_path: str) -> 'SharedStore':
+        """ Build the store of a class from its file, streaming the
+        objects
+        """
+        with open(file_path + '.log', 'a+b') as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            log_position = _log_position(log)
+            key = file_key(file_path)
+            text = '{}'
+            if key is not None:
+                with open(file_path, 'r') as f:
+                    text = f.read()
+        return cls(obj_class, iter_json_object(text), file_path, key,
+                   log_position)
+
+    def _current(self) -> Snapshot:
+        """ Snapshot to read from, after applying the writes other
+        processes logged since the last check
+        """
+        if self.file_path is None or self.REFRESH_INTERVAL < 0:
+            return self._snapshot
+        now = time.monotonic()
+        if now - self._checked_at < self.REFRESH_INTERVAL:
+            return self._snapshot
+        if not self._refresh_lock.acquire(blocking=False):
+            return self._snapshot
+        try:
+            self._checked_at = now
+            if self._rebuild_thread is None:
+                try:
+                    with open(self.file_path + '.log', 'rb') as log:
+                        fcntl.flock(log, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                        self._catch_up(log)
+                except (BlockingIOError, FileNotFoundError):
+                    pass
+            return self._snapshot
+        finally:
+            self._refresh_lock.release()
+
+    def _catch_up(self, log):
+        """ Apply the log lines written since the last read, or start a
+        rebuild if the log was truncated or the file replaced outside of
+        it. Called with the refresh lock and a lock on the log
+        """
+        log.seek(0)
+        generation = log.readline()
+        if generation.strip().decode() != self._log_generation:
+            self._start_rebuild()
+            return
+        log.seek(self._log_offset)
+        for line in log:
+            if not line.endswith(b'\n'):
+                break
+            self._apply(json.loads(line))
+            self._log_offset += len(line)
+        if file_key(self.file_path) != self._file_key:
+            self._start_rebuild()
+
+    def _apply(self, change: dict):
+        """ Merge a logged change of another process into the overlay,
+        unpersisted writes of this one win
+        """
+        for obj_id, obj_json in change['saved'].items():
+            if obj_id in self._pending:
+                continue
+            if not self._present(obj_id):
+                self._count += 1
+            self._overlay[obj_id] = self.cls(**obj_json)
+            self._tombstones.discard(obj_id)
+        for obj_id in change['removed']:
+            if obj_id in self._pending:
+                continue
+            if self._present(obj_id):
+                self._count -= 1
+            self._overlay.pop(obj_id, None)
+            if self._snapshot.find(obj_id) is not None:
+                self._tombstones.add(obj_id)
+        self._file_key = tuple(change['key']) if change['key'] else None
+
+    def _present(self, obj_id: str) -> bool:
+        """ Whether an id is in the store, without refreshing
+        """
+        return obj_id in self._overlay or (
+            obj_id not in self._tombstones and
+            self._snapshot.find(obj_id) is not None)
+
+    def _start_rebuild(self):
+        """ Rebuild the snapshot from the file in a background thread,
+        unless a rebuild is running. Called with the refresh lock
+        """
+        if self._rebuild_thread is not None:
+            return
+        self._rebuild_thread = threading.Thread(
+            target=self._rebuild, name='store-rebuild', daemon=True)
+        self._rebuild_thread.start()
+
+    def _rebuild(self):
+        """ Read the file and the log position, build the snapshot, then
+        swap it in keeping only the unpersisted writes in the overlay and
+        apply what was logged meanwhile
+        """
+        try:
+            with open(self.file_path + '.log', 'a+b') as log:
+                fcntl.flock(log, fcntl.LOCK_SH)
+                log_position = _log_position(log)
+                key = file_key(self.file_path)
+                text = '{}'
+                if key is not None:
+                    with open(self.file_path, 'r') as f:
+                        text = f.read()
+            snapshot = Snapshot(iter_json_object(text), self.INDEXED, key)
+            with self._refresh_lock:
+                self._snapshot = snapshot
+                self._file_key = key
+                self._log_generation, self._log_offset = log_position
+                self._overlay = {obj_id: obj for obj_id, obj
+                                 in list(self._overlay.items())
+                                 if obj_id in self._pending}
+                self._tombstones = {obj_id for obj_id in self._tombstones
+                                    if obj_id in self._pending}
+                self._count = len(snapshot) + sum(
+                    1 for obj_id in self._overlay
+                    if snapshot.find(obj_id) is None) - sum(
+                    1 for obj_id in self._tombstones
+                    if snapshot.find(obj_id) is not None)
+                with open(self.file_path + '.log', 'rb') as log:
+                    fcntl.flock(log, fcntl.LOCK_SH)
+                    self._catch_up(log)
+        finally:
+            self._rebuild_thread = None
+
+    def _shared(self, obj_id: str) -> Optional[dict]:
+        """ JSON dict of the snapshot row of an id, None if the id has no
+        row or if the overlay replaced or removed it
+        """
+        snapshot = self._current()
+        if obj_id in self._overlay or obj_id in self._tombstones:
+            return None
+        return snapshot.find(obj_id)
+
+    def _rows(self) -> Iterator[dict]:
+        """ JSON dicts of the snapshot rows still current
+        """
+        for obj_json in self._current().rows():
+            obj_id = obj_json.get('id')
+            if obj_id not in self._overlay and \
+                    obj_id not in self._tombstones:
+                yield obj_json
+
+    def get(self, obj_id: str, default=None):
+        """ Object of an id, from the overlay or decoded from its row
+        """
+        obj_json = self._shared(obj_id)
+        if obj_json is not None:
+            return self.cls(**obj_json)
+        return self._overlay.get(obj_id, default)
+
+    def __getitem__(self, obj_id: str):
+        """ Object of an id, KeyError if missing
+        """
+        obj = self.get(obj_id)
+        if obj is None:
+            raise KeyError(obj_id)
+        return obj
+
+    def __setitem__(self, obj_id: str, obj):
+        """ Record a saved object in the overlay
+        """
+        if obj_id not in self:
+            self._count += 1
+        self._overlay[obj_id] = obj
+        self._tombstones.discard(obj_id)
+        self._pending.add(obj_id)
+
+    def __delitem__(self, obj_id: str):
+        """ Record a removed object
+        """
+        if obj_id not in self:
+            raise KeyError(obj_id)
+        self._overlay.pop(obj_id, None)
+        self._tombstones.add(obj_id)
+        self._pending.add(obj_id)
+        self._count -= 1
+
+    def __contains__(self, obj_id: str) -> bool:
+        """ Whether an id is in the store
+        """
+        return self._shared(obj_id) is not None or obj_id in self._overlay
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        self._current()
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        """ Ids of the objects
+        """
+        return iter(self.keys())
+
+    def keys(self) -> List[str]:
+        """ Ids of the objects
+        """
+        return list(self._overlay) + [obj_json['id']
+                                      for obj_json in self._rows()]
+
+    def values(self) -> Iterator:
+        """ Every object, rows decoded one at a time
+        """
+        for obj in list(self._overlay.values()):
+            yield obj
+        for obj_json in self._rows():
+            yield self.cls(**obj_json)
+
+    def items(self) -> Iterator:
+        """ (id, object) pairs
+        """
+        for obj in self.values():
+            yield obj.id, obj
+
+    def lookup(self, attributes: dict) -> Optional[list]:
+        """ Candidates of a search by the indexed attribute, None when
+        the search can't use the index
+        """
+        value = attributes.get(self.INDEXED)
+        if value is None:
+            return None
+        snapshot = self._current()
+        candidates = [obj for obj in list(self._overlay.values())
+                      if getattr(obj, self.INDEXED, None) == value]
+        for obj_json in snapshot.matching(value):
+            obj_id = obj_json.get('id')
+            if obj_id not in self._overlay and \
+                    obj_id not in self._tombstones:
+                candidates.append(self.cls(**obj_json))
+        return candidates
+
+    def persist(self, file_path: str):
+        """ Merge the unpersisted writes into the file and append them to
+        the log, under an exclusive lock on the log. Writes made
+        meanwhile stay unpersisted.
+        """
+        with self._refresh_lock, open(file_path + '.log', 'a+b') as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            if self._rebuild_thread is None:
+                self._catch_up(log)
+            writes = [(obj_id, self._overlay.get(obj_id))
+                      for obj_id in list(self._pending)]
+            objs_json = {}
+            if path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    objs_json = json.load(f)
+            change = {'saved': {}, 'removed': []}
+            for obj_id, obj in writes:
+                if obj is None:
+                    objs_json.pop(obj_id, None)
+                    change['removed'].append(obj_id)
+                else:
+                    objs_json[obj_id] = change['saved'][obj_id] = \
+                        obj.to_json(True)
+            tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(objs_json, f)
+            os.replace(tmp_path, file_path)
+            change['key'] = self._file_key = file_key(file_path)
+
+            log.seek(0, os.SEEK_END)
+            if log.tell() > self.LOG_MAX_BYTES:
+                log.truncate(0)
+                _log_position(log)
+                self._start_rebuild()
+            log.write(json.dumps(change).encode() + b'\n')
+            log.flush()
+            self._log_generation, self._log_offset = _log_position(log)
+
+            for obj_id, obj in writes:
+                if self._overlay.get(obj_id) is obj:
+                    self._pending.discard(obj_id)
+
+
+def _log_position(log) -> Tuple[str, int]:
+    """ (generation, size) of a locked store log, writing the generation
+    line of a new or truncated log
+    """
+    log.seek(0)
+    generation = log.readline()
+    if not generation:
+        log.write(uuid.uuid4().hex.encode() + b'\n')
+        log.flush()
+        log.seek(0)
+        generation = log.readline()
+    return generation.strip().decode(), log.seek(0, os.SEEK_END)
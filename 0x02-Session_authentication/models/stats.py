@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" Stats module
+"""
+from collections import Counter
+from typing import Callable, Dict, Tuple
+import hashlib
+import json
+import threading
+
+from models.base import Base, DATA
+
+
+class Stats():
+    """ Per class object counts and derived aggregates, kept up to date
+    by the store listener so that reading them never scans DATA.
+
+    The JSON snapshot and its ETag are built once per change and served
+    as is until the next one.
+    """
+
+    def __init__(self):
+        """ Initialize empty counters
+        """
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.aggregates: Dict[str, Tuple[str, Callable, Counter]] = {}
+        self.version = 0
+        self._snapshot = None
+
+    def add_aggregate(self, name: str, s_class: str, key: Callable):
+        """ Count the objects of a class per key(obj), like signups per
+        day, reported under name
+        """
+        with self._lock:
+            counter = Counter(key(obj) for obj in DATA.get(s_class,
+                                                           {}).values())
+            self.aggregates[name] = (s_class, key, counter)
+            self._changed()
+
+    def record(self, event: str, obj):
+        """ Store listener
+        """
+        with self._lock:
+            if event == 'load':
+                self._reload(obj.__name__)
+            elif event in ('create', 'remove'):
+                step = 1 if event == 'create' else -1
+                s_class = obj.__class__.__name__
+                self.counts[s_class] = self.counts.get(s_class, 0) + step
+                for a_class, key, counter in self.aggregates.values():
+                    if a_class == s_class:
+                        counter[key(obj)] += step
+                        if counter[key(obj)] <= 0:
+                            del counter[key(obj)]
+            else:
+                return
+            self._changed()
+
+    def _reload(self, s_class: str):
+        """ Recount a class after its objects were loaded from file
+        """
+        objs = DATA.get(s_class, {})
+        self.counts[s_class] = len(objs)
+        for a_class, key, counter in self.aggregates.values():
+            if a_class == s_class:
+                counter.clear()
+                counter.update(key(obj) for obj in objs.values())
+
+    def _changed(self):
+        """ Drop the snapshot, called with the lock held
+        """
+        self.version += 1
+        self._snapshot = None
+
+    def snapshot(self) -> Tuple[bytes, str]:
+        """ JSON body and ETag of the current stats
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            stats = {"{}s".format(s_class.lower()): count
+                     for s_class, count in self.counts.items()}
+            for name, (_, _, counter) in self.aggregates.items():
+                stats[name] = dict(sorted(counter.items()))
+            body = json.dumps(stats, sort_keys=True).encode()
+            snapshot = (body, hashlib.sha1(body).hexdigest())
+            self._snapshot = snapshot
+        return snapshot
+
+
+stats = Stats()
+Base.listen(stats.record)
@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 """ User module
 """
-import hashlib
-from models.base import Base
+import os
+from models.base import Base, DATA
+from models.stats import stats
+from models.hashers import (Hasher, Sha256Hasher, Pbkdf2Hasher,
+                            ScryptHasher, BcryptHasher, hasher_name)
 
 
 class User(Base):
     """ User class
     """
+    hashers = {}
+    default_hasher = os.getenv('PASSWORD_HASHER', Sha256Hasher.name)
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
@@ -26,22 +31,44 @@ class User(Base):
 
     @password.setter
     def password(self, pwd: str):
-        """ Setter of a new password: encrypt in SHA256
+        """ Setter of a new password: encrypt with the default hasher
         """
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            self._password = self.hashers[self.default_hasher].encode(pwd)
+
+    @classmethod
+    def register_hasher(cls, hasher: Hasher):
+        """ Make a hasher available for new and stored passwords
+        """
+        cls.hashers[hasher.name] = hasher
 
     def is_valid_password(self, pwd: str) -> bool:
-        """ Validate a password
+        """ Validate a password, upgrading its hash on success when the
+        default hasher is stronger or has newer parameters
         """
         if pwd is None or type(pwd) is not str:
             return False
         if self.password is None:
             return False
-        pwd_e = pwd.encode()
-        return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
+        hasher = self.hashers.get(hasher_name(self.password))
+        if hasher is None or not hasher.verify(pwd, self.password):
+            return False
+        if self._needs_upgrade(hasher):
+            self.password = pwd
+            if self.id in DATA[self.__class__.__name__]:
+                self.save()
+        return True
+
+    def _needs_upgrade(self, hasher: Hasher) -> bool:
+        """ Whether a hash verified by hasher should be re-encoded with
+        the default hasher: never toward a weaker one
+        """
+        default = self.hashers[self.default_hasher]
+        if default.name == hasher.name:
+            return hasher.needs_update(self.password)
+        return default.strength > hasher.strength
 
     def display_name(self) -> str:
         """ Display User name based on email/first_name/last_name
@@ -57,3 +84,10 @@ class User(Base):
             return "{}".format(self.last_name)
         else:
             return "{} {}".format(self.first_name, self.last_name)
+
+
+for _hasher in (Sha256Hasher(), Pbkdf2Hasher(), ScryptHasher(),
+                BcryptHasher()):
+    User.register_hasher(_hasher)
+stats.add_aggregate('signups_per_day', 'User',
+                    lambda user: user.created_at.strftime('%Y-%m-%d'))
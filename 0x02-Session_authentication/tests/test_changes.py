@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+""" Tests of the change feed spill and consumers
+"""
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+from models.changes import ChangeFeed
+
+
+class Item():
+    """ Minimal stored object
+    """
+
+    def __init__(self, number: int):
+        """ Initialize an item
+        """
+        self.id = str(number)
+
+    def to_json(self) -> dict:
+        """ JSON dictionary of the item
+        """
+        return {"id": self.id}
+
+
+class TestChangeFeed(unittest.TestCase):
+    """ Tests of ChangeFeed spilling
+    """
+
+    def setUp(self):
+        """ Feed of 4 changes in memory, spilling to a temporary file
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.feed = ChangeFeed(4, os.path.join(self.directory.name, 'spill'),
+                               consumer_ttl=60)
+        self.spill = self.feed._spill_file()
+
+    def tearDown(self):
+        """ Remove the spill
+        """
+        self.feed.close()
+        self.directory.cleanup()
+
+    def record(self, count: int):
+        """ Record count creates
+        """
+        for number in range(count):
+            self.feed.record('create', Item(number))
+
+    def test_lagging_consumer_reads_spill(self):
+        """ Changes evicted while a consumer lags are read back from the
+        spill, in order
+        """
+        self.feed.changes(0, consumer='sync')
+        self.record(10)
+        self.assertTrue(os.path.exists(self.spill))
+        answer = self.feed.changes(0, limit=100, consumer='sync')
+        self.assertFalse(answer["reset"])
+        self.assertEqual([change["seq"] for change in answer["changes"]],
+                         list(range(1, 11)))
+
+    def test_no_consumer_no_spill(self):
+        """ Without a consumer evicted changes are dropped
+        """
+        self.record(10)
+        self.assertFalse(os.path.exists(self.spill))
+
+    def test_forget_removes_spill(self):
+        """ Unregistering the only lagging consumer removes the spill
+        """
+        self.feed.changes(0, consumer='sync')
+        self.record(10)
+        self.assertTrue(self.feed.forget('sync'))
+        self.assertFalse(os.path.exists(self.spill))
+        self.assertFalse(self.feed.forget('sync'))
+        self.assertTrue(self.feed.changes(0)["reset"])
+
+    def test_forget_keeps_spill_needed_by_another(self):
+        """ The spill stays while another consumer still needs it
+        """
+        self.feed.changes(0, consumer='sync')
+        self.feed.changes(0, consumer='other')
+        self.record(10)
+        self.feed.forget('sync')
+        self.assertTrue(os.path.exists(self.spill))
+
+    def test_expired_consumer_stops_spilling(self):
+        """ A consumer that stopped reading no longer holds the spill
+        """
+        self.feed.changes(0, consumer='gone')
+        self.record(10)
+        self.assertTrue(os.path.exists(self.spill))
+        later = mock.patch('models.changes.monotonic',
+                           return_value=10 ** 9)
+        with later:
+            self.record(1)
+        self.assertFalse(os.path.exists(self.spill))
+        self.assertEqual(self.feed._consumers, {})
+
+    def test_close_removes_spill(self):
+        """ The spill file is removed at exit
+        """
+        self.feed.changes(0, consumer='sync')
+        self.record(10)
+        self.feed.close()
+        self.assertFalse(os.path.exists(self.spill))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+""" Tests of the stack sampling profiler
+"""
+import threading
+import time
+import unittest
+
+from api.v1.profiler import ProfilerBusy, StackSampler, collapsed
+
+
+def busy_loop(stop: threading.Event):
+    """ Spin until stop is set
+    """
+    while not stop.is_set():
+        sum(range(100))
+
+
+class TestStackSampler(unittest.TestCase):
+    """ Tests of StackSampler
+    """
+
+    def test_samples_the_calling_thread(self):
+        """ The thread that starts a profile is sampled while it works,
+        as the only thread of a sync worker would be
+        """
+        sampler = StackSampler()
+        sampler.start(0.2, 0.001)
+        stop = threading.Event()
+        threading.Timer(0.3, stop.set).start()
+        busy_loop(stop)
+        self.assertTrue(sampler.wait(5))
+        stacks, ticks, seconds = sampler.result
+        self.assertGreater(ticks, 0)
+        self.assertEqual(seconds, 0.2)
+        self.assertIn('busy_loop (', collapsed(stacks))
+        self.assertNotIn('_sample (', collapsed(stacks))
+
+    def test_one_profile_at_a_time(self):
+        """ A second start while sampling is refused, then allowed again
+        """
+        sampler = StackSampler()
+        sampler.start(0.1, 0.01)
+        self.assertTrue(sampler.running())
+        with self.assertRaises(ProfilerBusy):
+            sampler.start(0.1, 0.01)
+        self.assertTrue(sampler.wait(5))
+        self.assertFalse(sampler.running())
+        sampler.start(0.01, 0.01)
+        self.assertTrue(sampler.wait(5))
+
+    def test_per_thread(self):
+        """ Stacks are prefixed with the thread name
+        """
+        sampler = StackSampler()
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,),
+                                  name='busy-worker')
+        worker.start()
+        sampler.start(0.05, 0.001, per_thread=True)
+        sampler.wait(5)
+        stop.set()
+        worker.join()
+        stacks = sampler.result[0]
+        self.assertTrue(any(stack[0] == 'busy-worker' and
+                            'busy_loop' in stack[-1] for stack in stacks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+""" Tests of the SharedStore of STORE_LOAD=shared
+"""
+from unittest import mock
+import json
+import os
+import tempfile
+import unittest
+
+from models.base import DATA
+from models.hashers import Pbkdf2Hasher
+from models.shared_store import SharedStore
+from models.user import User
+
+FILE = '.db_User.json'
+
+
+class TestSharedStore(unittest.TestCase):
+    """ Tests of SharedStore reads, writes and refresh
+    """
+
+    def setUp(self):
+        """ Run in an empty directory with one stored user
+        """
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        self.saved_data = DATA.get('User')
+        user = User(email='bob@hbtn.io')
+        user.password = 'pwd'
+        self.user_id = user.id
+        with open(FILE, 'w') as f:
+            json.dump({user.id: user.to_json(True)}, f)
+
+    def tearDown(self):
+        """ Restore the directory and the store
+        """
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+        DATA['User'] = self.saved_data
+
+    def test_password_upgrade_saved(self):
+        """ A hash upgraded on login is saved although every get decodes
+        a new instance
+        """
+        User.load_from_file(shared=True)
+        with mock.patch.object(User, 'default_hasher', Pbkdf2Hasher.name), \
+                mock.patch.object(Pbkdf2Hasher, 'iterations', 1000):
+            user = User.search({'email': 'bob@hbtn.io'})[0]
+            self.assertTrue(user.is_valid_password('pwd'))
+        self.assertTrue(User.get(self.user_id).password.startswith(
+            Pbkdf2Hasher.name + '$'))
+        with open(FILE) as f:
+            stored = json.load(f)[self.user_id]['_password']
+        self.assertTrue(stored.startswith(Pbkdf2Hasher.name + '$'))
+
+    def worker(self) -> SharedStore:
+        """ Store of the file checking the log on every read
+        """
+        store = SharedStore.from_file(User, FILE)
+        patcher = mock.patch.object(store, 'REFRESH_INTERVAL', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return store
+
+    def wait_rebuild(self, store: SharedStore):
+        """ Trigger a check and wait for the rebuild it starts
+        """
+        store._current()
+        thread = store._rebuild_thread
+        self.assertIsNotNone(thread)
+        thread.join(5)
+
+    def test_persist_keeps_snapshot(self):
+        """ Persisted writes stay in the overlay, the snapshot shared
+        with the master is never rebuilt
+        """
+        store = SharedStore.from_file(User, FILE)
+        DATA['User'] = store
+        snapshot = store._snapshot
+        user = User(email='alice@hbtn.io')
+        user.save()
+        self.assertIs(store._snapshot, snapshot)
+        self.assertEqual(store._pending, set())
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.get(user.id).email, 'alice@hbtn.io')
+        User.get(self.user_id).remove()
+        self.assertIs(store._snapshot, snapshot)
+        self.assertEqual(len(store), 1)
+        self.assertIsNone(store.get(self.user_id))
+        self.assertEqual(sorted(os.listdir()), [FILE, FILE + '.log'])
+
+    def test_other_worker_remove_visible(self):
+        """ A removal persisted by another store of the file shows up
+        from the log, without a rebuild
+        """
+        worker = self.worker()
+        snapshot = worker._snapshot
+        other = SharedStore.from_file(User, FILE)
+        del other[self.user_id]
+        other.persist(FILE)
+        self.assertNotIn(self.user_id, worker)
+        self.assertEqual(len(worker), 0)
+        self.assertIs(worker._snapshot, snapshot)
+        self.assertIsNone(worker._rebuild_thread)
+
+    def test_unpersisted_write_wins(self):
+        """ A logged change doesn't override a write not persisted yet
+        """
+        worker = self.worker()
+        other = SharedStore.from_file(User, FILE)
+        mine = worker[self.user_id]
+        mine.email = 'mine@hbtn.io'
+        worker[self.user_id] = mine
+        theirs = other[self.user_id]
+        theirs.email = 'theirs@hbtn.io'
+        other[self.user_id] = theirs
+        other.persist(FILE)
+        self.assertEqual(worker[self.user_id].email, 'mine@hbtn.io')
+        worker.persist(FILE)
+        with open(FILE) as f:
+            self.assertEqual(json.load(f)[self.user_id]['email'],
+                             'mine@hbtn.io')
+
+    def test_outside_write_rebuilds(self):
+        """ A file replaced outside of the log is reloaded in the
+        background, unpersisted writes are kept
+        """
+        worker = self.worker()
+        user = User(email='alice@hbtn.io')
+        worker[user.id] = user
+        with open(FILE, 'w') as f:
+            json.dump({}, f)
+        self.wait_rebuild(worker)
+        self.assertEqual(worker.keys(), [user.id])
+        self.assertEqual(len(worker), 1)
+
+    def test_truncated_log_rebuilds(self):
+        """ Past LOG_MAX_BYTES the log is truncated and the other
+        workers rebuild from the file
+        """
+        worker = self.worker()
+        other = SharedStore.from_file(User, FILE)
+        with mock.patch.object(SharedStore, 'LOG_MAX_BYTES', 0):
+            users = [User(email='{}@hbtn.io'.format(i)) for i in range(2)]
+            for user in users:
+                other[user.id] = user
+                other.persist(FILE)
+        thread = other._rebuild_thread
+        if thread is not None:
+            thread.join(5)
+        with open(FILE + '.log') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        self.wait_rebuild(worker)
+        self.assertEqual(len(worker), 3)
+        self.assertEqual(worker.lookup({'email': '1@hbtn.io'})[0].id,
+                         users[1].id)
+
+    def test_other_worker_write_visible(self):
+        """ A write persisted by another store of the same file shows up
+        on the next check
+        """
+        worker = SharedStore.from_file(User, FILE)
+        other = SharedStore.from_file(User, FILE)
+        user = User(email='alice@hbtn.io')
+        other[user.id] = user
+        other.persist(FILE)
+        with mock.patch.object(SharedStore, 'REFRESH_INTERVAL', 0):
+            self.assertEqual(len(worker), 2)
+            self.assertEqual(worker.lookup({'email': 'alice@hbtn.io'})[0].id,
+                             user.id)
+
+    def test_refresh_disabled(self):
+        """ A negative interval never reloads the file
+        """
+        worker = SharedStore.from_file(User, FILE)
+        other = SharedStore.from_file(User, FILE)
+        user = User(email='alice@hbtn.io')
+        other[user.id] = user
+        other.persist(FILE)
+        with mock.patch.object(SharedStore, 'REFRESH_INTERVAL', -1):
+            self.assertNotIn(user.id, worker)
+            self.assertEqual(len(worker), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+""" Tests of SignedSessionAuth token verification
+"""
+from unittest import mock
+import time
+import unittest
+
+from api.v1.auth.signed_session_auth import SignedSessionAuth, _b64encode
+
+
+def signed_auth(keys: str = 'k1:secret-one', **env) -> SignedSessionAuth:
+    """ SignedSessionAuth configured from env variables
+    """
+    env = dict({'SESSION_KEYS': keys, 'SESSION_NAME': '_my_session_id'},
+               **env)
+    with mock.patch.dict('os.environ', env):
+        return SignedSessionAuth()
+
+
+class TestSignedSessionAuth(unittest.TestCase):
+    """ Tests of claims_for_session_id
+    """
+
+    def setUp(self):
+        """ Auth with a single key
+        """
+        self.auth = signed_auth()
+
+    def test_valid_token(self):
+        """ A freshly created token carries its user id
+        """
+        token = self.auth.create_session('user-1')
+        self.assertEqual(self.auth.user_id_for_session_id(token), 'user-1')
+
+    def test_malformed_tokens(self):
+        """ Malformed tokens are rejected without raising
+        """
+        token = self.auth.create_session('user-1')
+        kid, payload, signature = token.split('.')
+        for session_id in (None, 42, '', 'abc', 'a.b', 'a.b.c.d', '..',
+                           'k1..{}'.format(signature),
+                           'k1.é.x', 'k1.abc.é',
+                           '{}.{}.{}é'.format(kid, payload, signature),
+                           '{}.{}=.{}'.format(kid, payload, signature),
+                           '{}.{}.{}'.format(kid, payload + 'A', signature),
+                           '{}.{}.{}'.format(kid, '!!', signature)):
+            with self.subTest(session_id=session_id):
+                self.assertIsNone(self.auth.claims_for_session_id(session_id))
+
+    def test_tampered_payload(self):
+        """ A payload changed after signing is rejected
+        """
+        token = self.auth.create_session('user-1')
+        kid, _, signature = token.split('.')
+        forged = _b64encode(b'{"sub":"admin","iat":0,"jti":"x"}')
+        self.assertIsNone(self.auth.claims_for_session_id(
+            '{}.{}.{}'.format(kid, forged, signature)))
+
+    def test_tampered_signature(self):
+        """ A changed signature is rejected
+        """
+        token = self.auth.create_session('user-1')
+        flipped = 'A' if token[-1] != 'A' else 'B'
+        self.assertIsNone(self.auth.claims_for_session_id(
+            token[:-1] + flipped))
+
+    def test_unknown_kid(self):
+        """ A token signed with a key that isn't configured is rejected
+        """
+        token = signed_auth('k9:other').create_session('user-1')
+        self.assertIsNone(self.auth.claims_for_session_id(token))
+
+    def test_expired_token(self):
+        """ A token past its expiry is rejected
+        """
+        auth = signed_auth(SESSION_DURATION='60')
+        token = auth.create_session('user-1')
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertIsNone(auth.claims_for_session_id(token))
+
+    def test_no_expiry(self):
+        """ SESSION_DURATION=0 issues tokens without expiry
+        """
+        auth = signed_auth(SESSION_DURATION='0')
+        token = auth.create_session('user-1')
+        self.assertNotIn('exp', auth.claims_for_session_id(token))
+
+    def test_revoked_token(self):
+        """ A revoked token is rejected, others still verify
+        """
+        token = self.auth.create_session('user-1')
+        other = self.auth.create_session('user-1')
+        self.assertTrue(self.auth.revoke(
+            self.auth.claims_for_session_id(token)))
+        self.assertIsNone(self.auth.claims_for_session_id(token))
+        self.assertIsNotNone(self.auth.claims_for_session_id(other))
+
+    def test_revoked_token_without_expiry(self):
+        """ A token without expiry stays revoked
+        """
+        auth = signed_auth(SESSION_DURATION='0')
+        token = auth.create_session('user-1')
+        self.assertTrue(auth.revoke(auth.claims_for_session_id(token)))
+        with mock.patch('time.time', return_value=time.time() + 10 ** 9):
+            self.assertIsNone(auth.claims_for_session_id(token))
+
+    def test_full_denylist(self):
+        """ A full denylist refuses new revocations and keeps the
+        revoked tokens revoked
+        """
+        auth = signed_auth(SESSION_DENYLIST_SIZE='2')
+        tokens = [auth.create_session('user-1') for _ in range(3)]
+        claims = [auth.claims_for_session_id(token) for token in tokens]
+        self.assertTrue(auth.revoke(claims[0]))
+        self.assertTrue(auth.revoke(claims[1]))
+        with self.assertLogs('api.v1.auth.signed_session_auth', 'WARNING'):
+            self.assertFalse(auth.revoke(claims[2]))
+        self.assertIsNone(auth.claims_for_session_id(tokens[0]))
+        self.assertIsNone(auth.claims_for_session_id(tokens[1]))
+        self.assertIsNotNone(auth.claims_for_session_id(tokens[2]))
+
+    def test_session_keys_required(self):
+        """ SESSION_KEYS is required, random opts in to a process key
+        """
+        with self.assertRaises(ValueError):
+            signed_auth('')
+        token = signed_auth('random').create_session('user-1')
+        self.assertTrue(token.startswith('local.'))
+
+    def test_rotated_key(self):
+        """ After a rotation tokens of the previous key still verify,
+        new tokens are signed with the new key, and a retired key no
+        longer verifies
+        """
+        old_token = self.auth.create_session('user-1')
+        rotated = signed_auth('k2:secret-two,k1:secret-one')
+        self.assertEqual(rotated.user_id_for_session_id(old_token), 'user-1')
+        new_token = rotated.create_session('user-2')
+        self.assertTrue(new_token.startswith('k2.'))
+        self.assertIsNone(self.auth.claims_for_session_id(new_token))
+        retired = signed_auth('k2:secret-two')
+        self.assertIsNone(retired.claims_for_session_id(old_token))
+        self.assertEqual(retired.user_id_for_session_id(new_token), 'user-2')
+
+    def test_same_kid_other_secret(self):
+        """ A token signed by another secret under the same kid is rejected
+        """
+        token = signed_auth('k1:not-the-secret').create_session('user-1')
+        self.assertIsNone(self.auth.claims_for_session_id(token))
+
+
+if __name__ == '__main__':
+    unittest.main()
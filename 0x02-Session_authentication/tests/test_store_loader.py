@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+""" Tests of the StoreLoader readiness barrier
+"""
+from unittest import mock
+import threading
+import time
+import unittest
+
+from models.loader import StoreLoader
+
+
+class Loaded():
+    """ Class whose objects load fine
+    """
+    @classmethod
+    def load_from_file(cls, shared: bool = False):
+        """ Load nothing
+        """
+
+
+class Corrupt():
+    """ Class whose file can't be parsed
+    """
+    @classmethod
+    def load_from_file(cls, shared: bool = False):
+        """ Fail like a corrupt JSON file
+        """
+        raise ValueError("Expecting value: line 1 column 1 (char 0)")
+
+
+class TestStoreLoader(unittest.TestCase):
+    """ Tests of load, loaded and wait
+    """
+
+    def test_load(self):
+        """ A successful load opens the barrier
+        """
+        loader = StoreLoader([Loaded])
+        self.assertFalse(loader.loaded())
+        loader.start()
+        self.assertTrue(loader.loaded())
+        self.assertTrue(loader.wait(0))
+
+    def test_failed_load(self):
+        """ A failed load opens the barrier with an error, wait doesn't
+        block and reports the failure
+        """
+        loader = StoreLoader([Loaded, Corrupt])
+        with self.assertRaises(ValueError):
+            loader.start()
+        self.assertIsInstance(loader.error, ValueError)
+        self.assertFalse(loader.loaded())
+        start = time.monotonic()
+        self.assertFalse(loader.wait(5))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_failed_background_load(self):
+        """ A failed background load doesn't keep waiters blocked
+        """
+        loader = StoreLoader([Corrupt])
+        with mock.patch.object(threading, 'excepthook'):
+            loader.start(background=True)
+            self.assertFalse(loader.wait(5))
+            for thread in threading.enumerate():
+                if thread.name == 'store-loader':
+                    thread.join()
+        self.assertTrue(loader.ready.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
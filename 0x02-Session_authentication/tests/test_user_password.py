@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+""" Tests of the password hash upgrade of User
+"""
+from unittest import mock
+import unittest
+
+from models.hashers import (BcryptHasher, Pbkdf2Hasher, ScryptHasher,
+                            Sha256Hasher)
+from models.user import User
+
+PASSWORD = 'correct horse'
+
+
+def user_with(encoded: str) -> User:
+    """ User, not saved, whose stored hash is encoded
+    """
+    return User(email='bob@hbtn.io', _password=encoded)
+
+
+class TestPasswordUpgrade(unittest.TestCase):
+    """ Tests of is_valid_password re-encoding the stored hash
+    """
+
+    def test_kdf_not_downgraded_to_sha256(self):
+        """ A salted hash is kept when the default is the legacy sha256
+        """
+        encoded = Pbkdf2Hasher().encode(PASSWORD, iterations=1000)
+        user = user_with(encoded)
+        with mock.patch.object(User, 'default_hasher', Sha256Hasher.name):
+            self.assertTrue(user.is_valid_password(PASSWORD))
+        self.assertEqual(user.password, encoded)
+
+    def test_scrypt_not_downgraded_to_pbkdf2(self):
+        """ A hash of a stronger hasher than the default is kept
+        """
+        encoded = ScryptHasher().encode(PASSWORD, n=2 ** 4)
+        user = user_with(encoded)
+        with mock.patch.object(User, 'default_hasher', Pbkdf2Hasher.name):
+            self.assertTrue(user.is_valid_password(PASSWORD))
+        self.assertEqual(user.password, encoded)
+
+    def test_sha256_upgraded(self):
+        """ A legacy hash is re-encoded with a stronger default
+        """
+        user = user_with(Sha256Hasher().encode(PASSWORD))
+        with mock.patch.object(User, 'default_hasher', ScryptHasher.name), \
+                mock.patch.object(ScryptHasher, 'n', 2 ** 4):
+            self.assertTrue(user.is_valid_password(PASSWORD))
+            self.assertTrue(user.password.startswith('scrypt$'))
+            self.assertTrue(user.is_valid_password(PASSWORD))
+
+    def test_outdated_parameters_upgraded(self):
+        """ A hash of the default hasher with old parameters is re-encoded
+        """
+        user = user_with(Pbkdf2Hasher().encode(PASSWORD, iterations=1000))
+        with mock.patch.object(User, 'default_hasher', Pbkdf2Hasher.name), \
+                mock.patch.object(Pbkdf2Hasher, 'iterations', 2000):
+            self.assertTrue(user.is_valid_password(PASSWORD))
+            self.assertEqual(user.password.split('$')[1], '2000')
+
+    def test_scrypt_cost_upgraded(self):
+        """ A scrypt hash with old cost parameters is re-encoded
+        """
+        user = user_with(ScryptHasher().encode(PASSWORD, n=2 ** 4))
+        with mock.patch.object(User, 'default_hasher', ScryptHasher.name), \
+                mock.patch.object(ScryptHasher, 'n', 2 ** 5):
+            self.assertTrue(user.is_valid_password(PASSWORD))
+            self.assertEqual(user.password.split('$')[1], str(2 ** 5))
+            self.assertFalse(ScryptHasher().needs_update(user.password))
+
+    def test_bcrypt_round_trip(self):
+        """ A bcrypt hash verifies its password only
+        """
+        with mock.patch.object(BcryptHasher, 'rounds', 4):
+            encoded = BcryptHasher().encode(PASSWORD)
+        self.assertTrue(encoded.startswith('bcrypt$'))
+        self.assertTrue(BcryptHasher().verify(PASSWORD, encoded))
+        self.assertFalse(BcryptHasher().verify('wrong', encoded))
+        self.assertFalse(BcryptHasher().verify(PASSWORD, 'bcrypt$broken'))
+
+    def test_bcrypt_rounds_upgraded(self):
+        """ A legacy hash moves to bcrypt, then to more bcrypt rounds
+        """
+        user = user_with(Sha256Hasher().encode(PASSWORD))
+        with mock.patch.object(User, 'default_hasher', BcryptHasher.name):
+            with mock.patch.object(BcryptHasher, 'rounds', 4):
+                self.assertTrue(user.is_valid_password(PASSWORD))
+                self.assertEqual(user.password.split('$')[3], '04')
+                first = user.password
+                self.assertTrue(user.is_valid_password(PASSWORD))
+                self.assertEqual(user.password, first)
+            with mock.patch.object(BcryptHasher, 'rounds', 5):
+                self.assertTrue(user.is_valid_password(PASSWORD))
+                self.assertEqual(user.password.split('$')[3], '05')
+
+    def test_wrong_password_not_upgraded(self):
+        """ A failed check leaves the hash alone
+        """
+        encoded = Sha256Hasher().encode(PASSWORD)
+        user = user_with(encoded)
+        with mock.patch.object(User, 'default_hasher', Pbkdf2Hasher.name):
+            self.assertFalse(user.is_valid_password('wrong'))
+        self.assertEqual(user.password, encoded)
+
+
+if __name__ == '__main__':
+    unittest.main()
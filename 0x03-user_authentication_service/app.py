@@ -1,13 +1,44 @@
 #!/usr/bin/env python3
 """Flask main entry point"""
 
-from flask import Flask, jsonify, make_response
+import os
+from flask import Flask, Response, jsonify, make_response
 from flask import request, abort, redirect, url_for
 from auth import Auth
+from instrumentation import instrumentation
+from rate_limit import (AdmissionController, RateLimiter, admission_slots,
+                        counter_store)
 
 app = Flask(__name__)
 AUTH = Auth()
 
+# The sweeper runs with the development server, under another server
+# set RESET_TOKEN_SWEEPER=1 on a single process only.
+RESET_TOKEN_SWEEP_INTERVAL = float(os.getenv("RESET_TOKEN_SWEEP_INTERVAL",
+                                             300))
+if RESET_TOKEN_SWEEP_INTERVAL > 0 and os.getenv("RESET_TOKEN_SWEEPER"):
+    AUTH.start_reset_token_sweeper(RESET_TOKEN_SWEEP_INTERVAL)
+
+RATE_LIMIT_STORE = counter_store()
+# Attempts on an email are counted per client address, so that another
+# client can't lock the owner of an account out of it.
+LOGIN_EMAIL_LIMITER = RateLimiter.from_env("LOGIN_RATE_EMAIL", "5/60",
+                                           RATE_LIMIT_STORE)
+LOGIN_IP_LIMITER = RateLimiter.from_env("LOGIN_RATE_IP", "30/60",
+                                        RATE_LIMIT_STORE)
+BCRYPT_MAX_CONCURRENCY = int(os.getenv("BCRYPT_MAX_CONCURRENCY",
+                                       os.cpu_count() or 1))
+BCRYPT_ADMISSION = AdmissionController(
+    BCRYPT_MAX_CONCURRENCY,
+    float(os.getenv("BCRYPT_ADMISSION_TIMEOUT", 0.05)),
+    admission_slots(BCRYPT_MAX_CONCURRENCY))
+
+
+@app.teardown_appcontext
+def shutdown_session(exception=None) -> None:
+    """Release the request's database session."""
+    AUTH.end_request()
+
 
 @app.route("/", methods=["GET"])
 def index():
@@ -24,11 +55,14 @@ def register_user() -> str:
     if not email or not password:
         return jsonify({"message": "email and password are required"}), 400
 
-    try:
-        user = AUTH.register_user(email, password)
-        return jsonify({"email": user.email, "message": "user created"}), 200
-    except ValueError:
-        return jsonify({"message": "email already registered"}), 400
+    with BCRYPT_ADMISSION.slot() as admitted:
+        if not admitted:
+            abort(429)
+        try:
+            user = AUTH.register_user(email, password)
+        except ValueError:
+            return jsonify({"message": "email already registered"}), 400
+    return jsonify({"email": user.email, "message": "user created"}), 200
 
 
 @app.route('/sessions', methods=['POST'])
@@ -37,10 +71,18 @@ def login() -> str:
     email = request.form.get('email')
     password = request.form.get('password')
 
-    if not AUTH.valid_login(email, password):
-        abort(401)
+    if not LOGIN_IP_LIMITER.hit(request.remote_addr) or \
+            not LOGIN_EMAIL_LIMITER.hit(
+                "{} {}".format(request.remote_addr, email)):
+        abort(429)
 
-    session_id = AUTH.create_session(email)
+    with BCRYPT_ADMISSION.slot() as admitted:
+        if not admitted:
+            abort(429)
+        session_id = AUTH.login(email, password)
+
+    if session_id is None:
+        abort(401)
 
     response = make_response(jsonify({"email": email, "message": "logged in"}))
     response.set_cookie("session_id", session_id)
@@ -61,7 +103,7 @@ def logout():
     if user is None:
         abort(403)
 
-    AUTH.destroy_session(user.id)
+    AUTH.destroy_session(user.id, session_id)
 
     return redirect(url_for('index'))
 
@@ -108,13 +150,49 @@ def update_password():
     if not email or not reset_token or not new_password:
         abort(400)
 
-    try:
-        AUTH.update_password(reset_token, new_password)
-    except ValueError:
-        abort(403)
+    with BCRYPT_ADMISSION.slot() as admitted:
+        if not admitted:
+            abort(429)
+        try:
+            AUTH.update_password(reset_token, new_password)
+        except ValueError:
+            abort(403)
 
     return jsonify({"email": email, "message": "Password updated"}), 200
 
 
+@app.route('/stats/session_cache', methods=['GET'])
+def session_cache_stats():
+    """Hit/miss counters of the session cache."""
+    return jsonify(AUTH.session_cache.stats()), 200
+
+
+@app.route('/stats/admission', methods=['GET'])
+def admission_stats():
+    """Admitted/shed counters of the bcrypt admission control."""
+    return jsonify(BCRYPT_ADMISSION.stats()), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Latency quantiles per route and stage, Prometheus text format."""
+    return Response(instrumentation.metrics.render(),
+                    mimetype="text/plain; version=0.0.4")
+
+
+instrumentation.instrument_app(app)
+instrumentation.instrument_object(
+    AUTH, ["register_user", "login", "get_user_from_session_id",
+           "destroy_session", "get_reset_password_token",
+           "update_password"], "auth")
+instrumentation.instrument_object(
+    AUTH._db, ["add_user", "find_user_by", "add_session",
+               "find_user_by_session_id", "delete_sessions",
+               "add_reset_token", "find_reset_token", "reset_password",
+               "update_user"], "db")
+
+
 if __name__ == "__main__":
+    if RESET_TOKEN_SWEEP_INTERVAL > 0 and not os.getenv("RESET_TOKEN_SWEEPER"):
+        AUTH.start_reset_token_sweeper(RESET_TOKEN_SWEEP_INTERVAL)
     app.run(host="0.0.0.0", port=5000)
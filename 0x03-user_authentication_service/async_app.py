@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""ASGI entry point, same routes as app.py on Quart
+
+Needs the packages of requirements-async.txt. Run with an ASGI
+server, e.g. `hypercorn async_app:app`.
+"""
+
+import asyncio
+import os
+from quart import Quart, jsonify, make_response
+from quart import request, abort, redirect, url_for
+from async_auth import AsyncAuth
+from rate_limit import (AsyncAdmissionController, MemoryCounterStore,
+                        RateLimiter, admission_slots, counter_store)
+
+app = Quart(__name__)
+AUTH = AsyncAuth()
+
+RATE_LIMIT_STORE = counter_store()
+# Attempts on an email are counted per client address, so that another
+# client can't lock the owner of an account out of it.
+LOGIN_EMAIL_LIMITER = RateLimiter.from_env("LOGIN_RATE_EMAIL", "5/60",
+                                           RATE_LIMIT_STORE)
+LOGIN_IP_LIMITER = RateLimiter.from_env("LOGIN_RATE_IP", "30/60",
+                                        RATE_LIMIT_STORE)
+BCRYPT_MAX_CONCURRENCY = int(os.getenv("BCRYPT_MAX_CONCURRENCY",
+                                       os.cpu_count() or 1))
+BCRYPT_ADMISSION = AsyncAdmissionController(
+    BCRYPT_MAX_CONCURRENCY,
+    float(os.getenv("BCRYPT_ADMISSION_TIMEOUT", 0.05)),
+    admission_slots(BCRYPT_MAX_CONCURRENCY))
+
+
+async def rate_limited(limiter: RateLimiter, key: str) -> bool:
+    """True if a hit is over the limit, the SQLite store is hit from a
+    thread so that it never blocks the event loop."""
+    if isinstance(RATE_LIMIT_STORE, MemoryCounterStore):
+        return not limiter.hit(key)
+    return not await asyncio.to_thread(limiter.hit, key)
+
+
+@app.before_serving
+async def startup() -> None:
+    """Prepare the database before the first request."""
+    await AUTH.setup()
+
+
+@app.after_serving
+async def shutdown() -> None:
+    """Release the database pool and bcrypt threads."""
+    await AUTH.close()
+
+
+@app.route("/", methods=["GET"])
+async def index():
+    """Return a welcome message as a payload."""
+    return jsonify({"message": "Bienvenue"})
+
+
+@app.route("/users", methods=["POST"])
+async def register_user() -> str:
+    """Route to register a new user."""
+    form = await request.form
+    email = form.get("email")
+    password = form.get("password")
+
+    if not email or not password:
+        return jsonify({"message": "email and password are required"}), 400
+
+    async with BCRYPT_ADMISSION.slot() as admitted:
+        if not admitted:
+            abort(429)
+        try:
+            user = await AUTH.register_user(email, password)
+        except ValueError:
+            return jsonify({"message": "email already registered"}), 400
+    return jsonify({"email": user.email, "message": "user created"}), 200
+
+
+@app.route('/sessions', methods=['POST'])
+async def login() -> str:
+    """POST /sessions route for logging in a user."""
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+
+    if await rate_limited(LOGIN_IP_LIMITER, request.remote_addr) or \
+            await rate_limited(LOGIN_EMAIL_LIMITER, "{} {}".format(
+                request.remote_addr, email)):
+        abort(429)
+
+    async with BCRYPT_ADMISSION.slot() as admitted:
+        if not admitted:
+            abort(429)
+        session_id = await AUTH.login(email, password)
+
+    if session_id is None:
+        abort(401)
+
+    response = await make_response(
+        jsonify({"email": email, "message": "logged in"}))
+    response.set_cookie("session_id", session_id)
+
+    return response
+
+
+@app.route('/sessions', methods=['DELETE'])
+async def logout():
+    """Log out a user by destroying their session."""
+    session_id = request.cookies.get('session_id')
+
+    if not session_id:
+        abort(403)
+
+    user = await AUTH.get_user_from_session_id(session_id)
+
+    if user is None:
+        abort(403)
+
+    await AUTH.destroy_session(user.id, session_id)
+
+    return redirect(url_for('index'))
+
+
+@app.route('/profile', methods=['GET'])
+async def profile():
+    """Profile route to get user information based on session_id."""
+    session_id = request.cookies.get('session_id')
+
+    if not session_id:
+        abort(403)
+
+    user = await AUTH.get_user_from_session_id(session_id)
+
+    if user is None:
+        abort(403)
+
+    return jsonify({"email": user.email}), 200
+
+
+@app.route('/reset_password', methods=['POST'])
+async def get_reset_password_token():
+    """POST /reset_password route to get a reset password token."""
+    form = await request.form
+    email = form.get('email')
+
+    if not email:
+        abort(400, description="Missing email")
+
+    try:
+        reset_token = await AUTH.get_reset_password_token(email)
+    except ValueError:
+        abort(403, description="Email not registered")
+
+    return jsonify({"email": email, "reset_token": reset_token}), 200
+
+
+@app.route('/reset_password', methods=['PUT'])
+async def update_password():
+    """Update the user's password using the reset token."""
+    form = await request.form
+    email = form.get('email')
+    reset_token = form.get('reset_token')
+    new_password = form.get('new_password')
+
+    if not email or not reset_token or not new_password:
+        abort(400)
+
+    async with BCRYPT_ADMISSION.slot() as admitted:
+        if not admitted:
+            abort(429)
+        try:
+            await AUTH.update_password(reset_token, new_password)
+        except ValueError:
+            abort(403)
+
+    return jsonify({"email": email, "message": "Password updated"}), 200
+
+
+@app.route('/stats/session_cache', methods=['GET'])
+async def session_cache_stats():
+    """Hit/miss counters of the session cache."""
+    return jsonify(AUTH.session_cache.stats()), 200
+
+
+@app.route('/stats/admission', methods=['GET'])
+async def admission_stats():
+    """Admitted/shed counters of the bcrypt admission control."""
+    return jsonify(BCRYPT_ADMISSION.stats()), 200
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000)
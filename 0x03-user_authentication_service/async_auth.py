@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Async authentication management"""
+
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import bcrypt
+from async_db import AsyncDB
+from datetime import datetime, timedelta
+from auth import _hash_password, _hash_token
+from session_cache import SessionCache, SessionUser
+from user import User
+from sqlalchemy.orm.exc import NoResultFound
+
+
+class AsyncAuth():
+    """Async counterpart of Auth.
+
+    Database calls go through AsyncDB and bcrypt runs in a thread pool
+    (bcrypt releases the GIL), so the event loop keeps serving cheap
+    session lookups while logins hash. Session lookups go through the
+    same SessionCache as Auth.
+    """
+
+    def __init__(self):
+        """Initialize the AsyncAuth class with an AsyncDB instance."""
+        self._db = AsyncDB()
+        self._bcrypt_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BCRYPT_THREADS", os.cpu_count() or 1)),
+            thread_name_prefix="bcrypt")
+        self._dummy_hash = _hash_password(uuid.uuid4().hex)
+        self.reset_token_ttl = int(os.getenv("RESET_TOKEN_TTL", 3600))
+        self.session_cache = SessionCache(
+            maxsize=int(os.getenv("SESSION_CACHE_SIZE", 10000)),
+            negative_maxsize=int(os.getenv("SESSION_CACHE_NEGATIVE", 1000)),
+            ttl=float(os.getenv("SESSION_CACHE_TTL", 60)))
+
+    async def setup(self) -> None:
+        """Prepare the database schema."""
+        await self._db.setup()
+
+    async def close(self) -> None:
+        """Release the database pool and the bcrypt threads."""
+        await self._db.dispose()
+        self._bcrypt_pool.shutdown(wait=False)
+
+    async def _run_bcrypt(self, function, *args):
+        """Run a bcrypt call in the bcrypt thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._bcrypt_pool, function, *args)
+
+    async def register_user(self, email: str, password: str) -> User:
+        """Register a new user with the given email and password.
+
+        Args:
+            email (str): The email of the user.
+            password (str): The password of the user.
+
+        Returns:
+            User: The created User object.
+
+        Raises:
+            ValueError: If a user with the given email already exists.
+        """
+        try:
+            await self._db.find_user_by(email=email)
+            raise ValueError(f"User {email} already exists")
+        except NoResultFound:
+            hashed = await self._run_bcrypt(_hash_password, password)
+            return await self._db.add_user(email=email,
+                                           hashed_password=hashed)
+
+    async def valid_login(self, email: str, password: str) -> bool:
+        """Validates user login by checking the email and password.
+
+        Args:
+            email (str): The email of the user.
+            password (str): The password of the user.
+
+        Returns:
+            bool: True if the login is valid, otherwise False.
+        """
+        return await self._check_login(email, password) is not None
+
+    async def _check_login(self, email: str,
+                           password: str) -> Optional[User]:
+        """Fetch a user by email and check the password, against a dummy
+        hash for unknown emails.
+
+        Args:
+            email (str): The email of the user.
+            password (str): The password of the user.
+
+        Returns:
+            Optional[User]: The user if the password matches, else None.
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+            hashed_password = user.hashed_password
+        except NoResultFound:
+            user = None
+            hashed_password = self._dummy_hash
+        if password is None:
+            password = ""
+        valid = await self._run_bcrypt(bcrypt.checkpw,
+                                       password.encode('utf-8'),
+                                       hashed_password)
+        return user if valid else None
+
+    async def login(self, email: str, password: str) -> Optional[str]:
+        """Validate the credentials and open a session in one go.
+
+        Args:
+            email (str): The email of the user.
+            password (str): The password of the user.
+
+        Returns:
+            Optional[str]: The new session ID, None if the login failed.
+        """
+        user = await self._check_login(email, password)
+        if user is None:
+            return None
+
+        session_id = str(uuid.uuid4())
+        await self._db.add_session(user.id, session_id)
+        self.session_cache.invalidate(session_id)
+        return session_id
+
+    async def create_session(self, email: str) -> str:
+        """Creates a new session for the user with the given email.
+
+        Args:
+            email (str): The email of the user.
+
+        Returns:
+            str: The session ID.
+
+        Raises:
+            NoResultFound: If no user is found with the provided email.
+        """
+        user = await self._db.find_user_by(email=email)
+        session_id = str(uuid.uuid4())
+        await self._db.add_session(user.id, session_id)
+        self.session_cache.invalidate(session_id)
+        return session_id
+
+    async def get_user_from_session_id(
+            self, session_id: Optional[str]) -> Optional[SessionUser]:
+        """Retrieves the user corresponding to the session ID, through
+        the session cache.
+
+        Args:
+            session_id (Optional[str]): The session ID.
+
+        Returns:
+            Optional[SessionUser]: The user's id and email if found,
+                otherwise None.
+        """
+        if session_id is None:
+            return None
+
+        generation = self.session_cache.generation()
+        cached, user = self.session_cache.get(session_id)
+        if cached:
+            return user
+
+        try:
+            found = await self._db.find_user_by_session_id(session_id)
+            user = SessionUser(id=found.id, email=found.email)
+        except NoResultFound:
+            user = None
+        self.session_cache.put(session_id, user, generation)
+        return user
+
+    async def destroy_session(self, user_id: int,
+                              session_id: str = None) -> None:
+        """Destroys a session of the user with the given user ID.
+
+        Args:
+            user_id (int): The ID of the user.
+            session_id (str): The session to destroy, all of the user's
+                sessions if None.
+        """
+        await self._db.delete_sessions(user_id, session_id)
+        if session_id is None:
+            self.session_cache.invalidate_user(user_id)
+        else:
+            self.session_cache.invalidate(session_id)
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """Generates and returns a reset password token for the user.
+
+        Args:
+            email (str): The email of the user.
+
+        Returns:
+            str: The reset token.
+
+        Raises:
+            ValueError: If no user is found with the given email.
+        """
+        try:
+            user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            raise ValueError(f"No user found with email: {email}")
+
+        reset_token = str(uuid.uuid4())
+        expires_at = datetime.utcnow() + timedelta(
+            seconds=self.reset_token_ttl)
+        await self._db.add_reset_token(user.id, _hash_token(reset_token),
+                                       expires_at)
+        return reset_token
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """Updates the user's password using the reset token.
+
+        Args:
+            reset_token (str): The reset token.
+            password (str): The new password.
+
+        Raises:
+            ValueError: If the reset token is invalid.
+        """
+        if not reset_token:
+            raise ValueError("Invalid reset token")
+        token_hash = _hash_token(reset_token)
+        try:
+            token = await self._db.find_reset_token(token_hash,
+                                                    datetime.utcnow())
+        except NoResultFound:
+            raise ValueError("Invalid reset token")
+
+        hashed_password = await self._run_bcrypt(_hash_password, password)
+        if not await self._db.reset_password(token.user_id, token_hash,
+                                             datetime.utcnow(),
+                                             hashed_password):
+            raise ValueError("Invalid reset token")
+        self.session_cache.invalidate_user(token.user_id)
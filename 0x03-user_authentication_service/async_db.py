@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Async DB module
+"""
+import os
+from datetime import datetime
+from typing import Any
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import (AsyncEngine, async_sessionmaker,
+                                    create_async_engine)
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.exc import InvalidRequestError
+
+from db import USER_COLUMNS
+from migrations import bootstrap_schema
+from user import Base, ResetToken, User, UserSession
+
+
+class AsyncDB:
+    """Async counterpart of DB on the aiosqlite driver
+    """
+
+    def __init__(self, database_url: str = None) -> None:
+        """Initialize a new AsyncDB instance, call setup() before use
+
+        Args:
+            database_url (str): SQLAlchemy async URL, defaults to the
+                ASYNC_DB_URL environment variable or
+                sqlite+aiosqlite:///a.db.
+        """
+        self._engine = self._create_engine(
+            database_url or os.getenv("ASYNC_DB_URL",
+                                      "sqlite+aiosqlite:///a.db"))
+        self._sessionmaker = async_sessionmaker(self._engine,
+                                                expire_on_commit=False)
+        self.schema_version = None
+
+    @staticmethod
+    def _create_engine(database_url: str) -> AsyncEngine:
+        """Create the async engine, with WAL mode on SQLite.
+
+        Args:
+            database_url (str): SQLAlchemy async URL of the database.
+
+        Returns:
+            AsyncEngine: The configured engine.
+        """
+        engine = create_async_engine(database_url, echo=False)
+
+        if engine.dialect.name == "sqlite":
+            @event.listens_for(engine.sync_engine, "connect")
+            def _set_sqlite_pragmas(dbapi_connection, connection_record):
+                """Enable WAL mode on every new SQLite connection"""
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA foreign_keys=ON")
+                cursor.close()
+
+        return engine
+
+    async def setup(self) -> None:
+        """Create missing tables and apply pending migrations
+        """
+        if os.getenv("DB_RESET"):
+            async with self._engine.begin() as connection:
+                await connection.run_sync(Base.metadata.drop_all)
+        async with self._engine.begin() as connection:
+            self.schema_version = await connection.run_sync(
+                bootstrap_schema)
+
+    async def dispose(self) -> None:
+        """Close all pooled connections
+        """
+        await self._engine.dispose()
+
+    async def add_user(self, email: str, hashed_password: str) -> User:
+        """Adds a new user to the database.
+
+        Args:
+            email (str): The email of the user.
+            hashed_password (str): The hashed password of the user.
+
+        Returns:
+            User: The created User object.
+        """
+        async with self._sessionmaker() as session:
+            new_user = User(email=email, hashed_password=hashed_password)
+            session.add(new_user)
+            await session.commit()
+            return new_user
+
+    async def find_user_by(self, **kwargs: Any) -> User:
+        """Finds a user by arbitrary keyword arguments.
+
+        Args:
+            **kwargs (dict): Keyword arguments to filter the query.
+
+        Returns:
+            User: The User object matching the query.
+
+        Raises:
+            NoResultFound: If no user matches the query.
+            InvalidRequestError: If the query arguments are invalid.
+        """
+        for key in kwargs:
+            if key not in USER_COLUMNS:
+                raise InvalidRequestError("Invalid query arguments")
+
+        async with self._sessionmaker() as session:
+            result = await session.execute(select(User).filter_by(**kwargs))
+            try:
+                return result.scalar_one()
+            except NoResultFound:
+                raise NoResultFound(
+                    "No user found with the provided arguments")
+
+    async def add_session(self, user_id: int,
+                          session_id: str) -> UserSession:
+        """Adds a login session for a user.
+
+        Args:
+            user_id (int): The ID of the user.
+            session_id (str): The new session ID.
+
+        Returns:
+            UserSession: The created UserSession object.
+        """
+        async with self._sessionmaker() as session:
+            user_session = UserSession(session_id=session_id,
+                                       user_id=user_id)
+            session.add(user_session)
+            await session.commit()
+            return user_session
+
+    async def find_user_by_session_id(self, session_id: str) -> User:
+        """Finds the user owning a session.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            User: The User object owning the session.
+
+        Raises:
+            NoResultFound: If no session matches the ID.
+        """
+        async with self._sessionmaker() as session:
+            result = await session.execute(
+                select(User).join(UserSession,
+                                  UserSession.user_id == User.id).where(
+                    UserSession.session_id == session_id))
+            try:
+                return result.scalar_one()
+            except NoResultFound:
+                raise NoResultFound(
+                    "No user found with the provided session")
+
+    async def delete_sessions(self, user_id: int,
+                              session_id: str = None) -> int:
+        """Deletes one session of a user, or all of them.
+
+        Args:
+            user_id (int): The ID of the user.
+            session_id (str): The session to delete, all if None.
+
+        Returns:
+            int: The number of deleted sessions.
+        """
+        statement = UserSession.__table__.delete().where(
+            UserSession.user_id == user_id)
+        if session_id is not None:
+            statement = statement.where(UserSession.session_id == session_id)
+        async with self._sessionmaker() as session:
+            result = await session.execute(statement)
+            await session.commit()
+            return result.rowcount
+
+    async def add_reset_token(self, user_id: int, token_hash: str,
+                              expires_at: datetime) -> ResetToken:
+        """Stores a reset token digest, replacing the user's previous
+        tokens.
+
+        Args:
+            user_id (int): The ID of the user.
+            token_hash (str): SHA256 hex digest of the token.
+            expires_at (datetime): UTC expiry of the token.
+
+        Returns:
+            ResetToken: The created ResetToken object.
+        """
+        async with self._sessionmaker() as session:
+            await session.execute(ResetToken.__table__.delete().where(
+                ResetToken.user_id == user_id))
+            reset_token = ResetToken(token_hash=token_hash, user_id=user_id,
+                                     expires_at=expires_at)
+            session.add(reset_token)
+            await session.commit()
+            return reset_token
+
+    async def find_reset_token(self, token_hash: str,
+                               now: datetime) -> ResetToken:
+        """Finds an unexpired reset token by its digest.
+
+        Args:
+            token_hash (str): SHA256 hex digest of the token.
+            now (datetime): Current UTC time.
+
+        Returns:
+            ResetToken: The matching ResetToken object.
+
+        Raises:
+            NoResultFound: If no unexpired token matches.
+        """
+        async with self._sessionmaker() as session:
+            reset_token = await session.get(ResetToken, token_hash)
+        if reset_token is None or reset_token.expires_at <= now:
+            raise NoResultFound("No valid reset token")
+        return reset_token
+
+    async def reset_password(self, user_id: int, token_hash: str,
+                             now: datetime, hashed_password: bytes) -> bool:
+        """Consumes an unexpired reset token of the user and sets the new
+        password in one transaction, so a token is only used once even
+        by concurrent requests.
+
+        Args:
+            user_id (int): The ID of the user.
+            token_hash (str): SHA256 hex digest of the token.
+            now (datetime): Current UTC time.
+            hashed_password (bytes): The new hashed password.
+
+        Returns:
+            bool: True if the token was consumed and the password set.
+        """
+        async with self._sessionmaker() as session:
+            consumed = await session.execute(
+                ResetToken.__table__.delete().where(
+                    ResetToken.token_hash == token_hash,
+                    ResetToken.user_id == user_id,
+                    ResetToken.expires_at > now))
+            if consumed.rowcount != 1:
+                await session.rollback()
+                return False
+            updated = await session.execute(User.__table__.update().where(
+                User.id == user_id).values(hashed_password=hashed_password))
+            if updated.rowcount != 1:
+                await session.rollback()
+                return False
+            await session.execute(ResetToken.__table__.delete().where(
+                ResetToken.user_id == user_id))
+            await session.commit()
+            return True
+
+    async def update_user(self, user_id: int, **kwargs: dict) -> int:
+        """Updates user attributes with a single UPDATE statement.
+
+        Args:
+            user_id (int): The ID of the user to update.
+            **kwargs: Attributes to update with their new values.
+
+        Returns:
+            int: The number of updated rows, 0 if no user has the ID.
+
+        Raises:
+            ValueError: If an invalid attribute is provided.
+        """
+        for key in kwargs:
+            if key not in USER_COLUMNS:
+                raise ValueError(f"Attribute {key} is not valid")
+
+        if not kwargs:
+            return 0
+
+        statement = User.__table__.update().where(
+            User.id == user_id).values(**kwargs)
+        async with self._sessionmaker() as session:
+            result = await session.execute(statement)
+            await session.commit()
+            return result.rowcount
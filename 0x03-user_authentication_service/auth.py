@@ -1,20 +1,58 @@
 #!/usr/bin/env python3
 """Password hashing and authentication management"""
 
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
 import bcrypt
+import hashlib
+import logging
+import os
+import threading
 import uuid
+from datetime import datetime, timedelta
 from db import DB
+from session_cache import SessionCache, SessionUser
 from user import User
 from sqlalchemy.orm.exc import NoResultFound
 
 
+def _hash_password(password: str) -> bytes:
+    """Hash a password with bcrypt, usable from worker processes."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+
+
+def _invalid_row(email: str, password: str) -> Optional[str]:
+    """Why a bulk import row can't be registered, None if it can."""
+    if not email or not password:
+        return "email and password are required"
+    if len(password.encode('utf-8')) > 72:
+        return "password longer than 72 bytes"
+    return None
+
+
+def _hash_token(token: str) -> str:
+    """Digest under which a reset token is stored."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
 class Auth():
     """Auth class to interact with the authentication database."""
 
     def __init__(self):
         """Initialize the Auth class with a database instance."""
         self._db = DB()
+        self._dummy_hash = _hash_password(uuid.uuid4().hex)
+        self.reset_token_ttl = int(os.getenv("RESET_TOKEN_TTL", 3600))
+        self._sweeper_stop = threading.Event()
+        self.session_cache = SessionCache(
+            maxsize=int(os.getenv("SESSION_CACHE_SIZE", 10000)),
+            negative_maxsize=int(os.getenv("SESSION_CACHE_NEGATIVE", 1000)),
+            ttl=float(os.getenv("SESSION_CACHE_TTL", 60)))
+
+    def end_request(self) -> None:
+        """Release the database session used by the current request."""
+        self._db.remove_session()
 
     def _hash_password(self, password: str) -> bytes:
         """Hash a password with bcrypt and return the hashed bytes.
@@ -25,11 +63,7 @@ class Auth():
         Returns:
             bytes: The salted and hashed password.
         """
-        password_bytes = password.encode('utf-8')
-
-        hashed_password = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
-
-        return hashed_password
+        return _hash_password(password)
 
     def register_user(self, email: str, password: str) -> User:
         """Register a new user with the given email and password.
@@ -52,6 +86,62 @@ class Auth():
             new_user = self._db.add_user(email=email, hashed_password=hashed)
             return new_user
 
+    def register_users(self, users: Iterable[Tuple[str, str]],
+                       batch_size: int = 1000,
+                       workers: Optional[int] = None,
+                       rejected: Optional[List[Tuple[str, str]]] = None
+                       ) -> Dict[str, int]:
+        """Register many users, skipping already registered emails.
+
+        Each batch costs one query to find duplicates, bcrypt hashing
+        spread over worker processes, and one executemany INSERT in its
+        own transaction. Rows bcrypt can't hash are rejected up front,
+        and an email registered concurrently only skips its own row.
+
+        Args:
+            users (Iterable[Tuple[str, str]]): (email, password) pairs.
+            batch_size (int): Users per transaction.
+            workers (Optional[int]): Hashing processes, defaults to the
+                number of CPUs.
+            rejected (Optional[List[Tuple[str, str]]]): Receives the
+                (email, reason) of every invalid row.
+
+        Returns:
+            Dict[str, int]: Counts of created, duplicate and invalid
+                users.
+        """
+        counts = {"created": 0, "duplicates": 0, "invalid": 0}
+        users = iter(users)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                batch = {}
+                for email, password in islice(users, batch_size):
+                    reason = _invalid_row(email, password)
+                    if reason:
+                        counts["invalid"] += 1
+                        if rejected is not None:
+                            rejected.append((email, reason))
+                    elif email in batch:
+                        counts["duplicates"] += 1
+                    else:
+                        batch[email] = password
+                if not batch:
+                    break
+
+                for email in self._db.existing_emails(batch):
+                    del batch[email]
+                    counts["duplicates"] += 1
+
+                emails = list(batch)
+                hashes = pool.map(_hash_password, batch.values(),
+                                  chunksize=max(1, len(emails) // 64))
+                created = self._db.add_users([
+                    {"email": email, "hashed_password": hashed}
+                    for email, hashed in zip(emails, hashes)])
+                counts["created"] += created
+                counts["duplicates"] += len(emails) - created
+        return counts
+
     def valid_login(self, email: str, password: str) -> bool:
         """Validates user login by checking the email and password.
 
@@ -62,12 +152,53 @@ class Auth():
         Returns:
             bool: True if the login is valid, otherwise False.
         """
+        return self._check_login(email, password) is not None
+
+    def _check_login(self, email: str, password: str) -> Optional[User]:
+        """Fetch a user by email and check the password.
+
+        Unknown emails are checked against a dummy hash so they cost the
+        same bcrypt work as known ones.
+
+        Args:
+            email (str): The email of the user.
+            password (str): The password of the user.
+
+        Returns:
+            Optional[User]: The user if the password matches, else None.
+        """
         try:
             user = self._db.find_user_by(email=email)
-            return bcrypt.checkpw(password.encode('utf-8'),
-                                  user.hashed_password)
+            hashed_password = user.hashed_password
         except NoResultFound:
-            return False
+            user = None
+            hashed_password = self._dummy_hash
+        if password is None:
+            password = ""
+        valid = bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+        return user if valid else None
+
+    def login(self, email: str, password: str) -> Optional[str]:
+        """Validate the credentials and open a session in one go.
+
+        The user is fetched once and the session is written in the same
+        database transaction.
+
+        Args:
+            email (str): The email of the user.
+            password (str): The password of the user.
+
+        Returns:
+            Optional[str]: The new session ID, None if the login failed.
+        """
+        user = self._check_login(email, password)
+        if user is None:
+            return None
+
+        session_id = self._generate_uuid()
+        self._db.add_session(user.id, session_id)
+        self.session_cache.invalidate(session_id)
+        return session_id
 
     def _generate_uuid(self) -> str:
         """Generates a new UUID and returns its string representation.
@@ -75,7 +206,7 @@ class Auth():
         Returns:
             str: The string representation of the UUID.
         """
-        return uuid.uuid4()
+        return str(uuid.uuid4())
 
     def create_session(self, email: str) -> str:
         """Creates a new session for the user with the given email.
@@ -95,40 +226,54 @@ class Auth():
             raise NoResultFound("No user found with provided credentials")
 
         session_id: str = self._generate_uuid()
-        self._db.update_user(user.id, session_id=session_id)
+        self._db.add_session(user.id, session_id)
+        self.session_cache.invalidate(session_id)
         return session_id
 
-    def get_user_from_session_id(self,
-                                 session_id: Optional[str]) -> Optional[User]:
-        """Retrieves the User object corresponding to the session ID.
+    def get_user_from_session_id(
+            self, session_id: Optional[str]) -> Optional[SessionUser]:
+        """Retrieves the user corresponding to the session ID, through
+        the session cache.
 
         Args:
             session_id (Optional[str]): The session ID.
 
         Returns:
-            Optional[User]: The User object if found, otherwise None.
+            Optional[SessionUser]: The user's id and email if found,
+                otherwise None.
         """
         if session_id is None:
             return None
 
+        generation = self.session_cache.generation()
+        cached, user = self.session_cache.get(session_id)
+        if cached:
+            return user
+
         try:
-            return self._db.find_user_by(session_id=session_id)
+            found = self._db.find_user_by_session_id(session_id)
+            user = SessionUser(id=found.id, email=found.email)
         except NoResultFound:
-            return None
+            user = None
+        self.session_cache.put(session_id, user, generation)
+        return user
 
-    def destroy_session(self, user_id: int) -> None:
-        """Destroys the session for the user with the given user ID.
+    def destroy_session(self, user_id: int, session_id: str = None) -> None:
+        """Destroys a session of the user with the given user ID.
 
         Args:
             user_id (int): The ID of the user.
+            session_id (str): The session to destroy, all of the user's
+                sessions if None.
 
         Returns:
             None
         """
-        try:
-            self._db.update_user(user_id, session_id=None)
-        except NoResultFound:
-            pass
+        self._db.delete_sessions(user_id, session_id)
+        if session_id is None:
+            self.session_cache.invalidate_user(user_id)
+        else:
+            self.session_cache.invalidate(session_id)
 
     def get_reset_password_token(self, email: str) -> str:
         """Generates and returns a reset password token for the user.
@@ -148,7 +293,10 @@ class Auth():
             raise ValueError(f"No user found with email: {email}")
 
         reset_token = str(uuid.uuid4())
-        self._db.update_user(user.id, reset_token=reset_token)
+        expires_at = datetime.utcnow() + timedelta(
+            seconds=self.reset_token_ttl)
+        self._db.add_reset_token(user.id, _hash_token(reset_token),
+                                 expires_at)
         return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
@@ -164,11 +312,56 @@ class Auth():
         Raises:
             ValueError: If the reset token is invalid.
         """
+        if not reset_token:
+            raise ValueError("Invalid reset token")
+        token_hash = _hash_token(reset_token)
         try:
-            user = self._db.find_user_by(reset_token=reset_token)
+            user_id = self._db.find_reset_token(token_hash,
+                                                datetime.utcnow()).user_id
         except NoResultFound:
             raise ValueError("Invalid reset token")
 
         hashed_password = self._hash_password(password)
-        self._db.update_user(user.id, hashed_password=hashed_password,
-                             reset_token=None)
+        if not self._db.reset_password(user_id, token_hash,
+                                       datetime.utcnow(), hashed_password):
+            raise ValueError("Invalid reset token")
+        self.session_cache.invalidate_user(user_id)
+
+    def start_reset_token_sweeper(self, interval: float,
+                                  batch_size: int = 500) -> threading.Thread:
+        """Start a daemon thread purging expired reset tokens.
+
+        Every `interval` seconds expired tokens are deleted in batches of
+        `batch_size`, each in its own short transaction. A failed sweep is
+        logged and retried at the next interval.
+
+        Args:
+            interval (float): Seconds between two sweeps.
+            batch_size (int): Maximum rows deleted per transaction.
+
+        Returns:
+            threading.Thread: The started thread.
+        """
+        def sweep() -> None:
+            """Purge expired tokens until a batch comes back short."""
+            while not self._sweeper_stop.wait(interval):
+                try:
+                    now = datetime.utcnow()
+                    while self._db.purge_expired_reset_tokens(
+                            now, batch_size) == batch_size:
+                        pass
+                except Exception:
+                    logging.getLogger(__name__).exception(
+                        "Reset token sweep failed, retrying in %ss",
+                        interval)
+                finally:
+                    self._db.remove_session()
+
+        thread = threading.Thread(target=sweep, name="reset-token-sweeper",
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def stop_reset_token_sweeper(self) -> None:
+        """Ask the reset token sweeper thread to exit."""
+        self._sweeper_stop.set()
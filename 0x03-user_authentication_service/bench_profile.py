@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Benchmark GET /profile latency against the number of users.
+
+Usage: ./bench_profile.py [sizes] [requests]
+  sizes     comma separated user counts, default 1000,10000,100000
+  requests  profile requests measured per size, default 2000
+
+Users and sessions are bulk inserted into a throwaway SQLite file, the
+table is topped up from one size to the next, and the latencies are
+printed as JSON. With indexed session lookups they stay flat.
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+DB_DIR = tempfile.mkdtemp()
+DB_FILE = os.path.join(DB_DIR, "bench.db")
+os.environ["DB_URL"] = "sqlite:///" + DB_FILE
+
+from app import app, AUTH  # noqa: E402
+from user import User, UserSession  # noqa: E402
+
+CHUNK = 10000
+
+
+def seed(engine, start: int, stop: int) -> list:
+    """Insert users start..stop-1 with one session each, return a
+    sample of their session ids."""
+    sample = []
+    with engine.begin() as connection:
+        for first in range(start, stop, CHUNK):
+            last = min(first + CHUNK, stop)
+            users = [{"id": i + 1, "email": "user{}@bench.io".format(i),
+                      "hashed_password": "x"} for i in range(first, last)]
+            sessions = [{"session_id": str(uuid.uuid4()), "user_id": i + 1}
+                        for i in range(first, last)]
+            connection.execute(User.__table__.insert(), users)
+            connection.execute(UserSession.__table__.insert(), sessions)
+            sample.extend(s["session_id"] for s in sessions[:100])
+    return sample
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Return a percentile of sorted values"""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(session_ids: list, requests: int) -> dict:
+    """Time profile requests for random sessions, in milliseconds"""
+    client = app.test_client()
+    timings = []
+    for _ in range(requests):
+        client.set_cookie("session_id", random.choice(session_ids))
+        start = time.perf_counter()
+        response = client.get("/profile")
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    timings.sort()
+    return {
+        "requests": requests,
+        "mean_ms": round(sum(timings) / len(timings), 4),
+        "p50_ms": round(percentile(timings, 0.50), 4),
+        "p95_ms": round(percentile(timings, 0.95), 4),
+        "p99_ms": round(percentile(timings, 0.99), 4),
+    }
+
+
+if __name__ == "__main__":
+    sizes = [1000, 10000, 100000]
+    if len(sys.argv) > 1:
+        sizes = [int(size) for size in sys.argv[1].split(",")]
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    engine = AUTH._db._engine
+    session_ids = []
+    seeded = 0
+    results = []
+    for size in sorted(sizes):
+        session_ids.extend(seed(engine, seeded, size))
+        seeded = size
+        result = measure(session_ids, requests)
+        result["users"] = size
+        results.append(result)
+    print(json.dumps({"benchmark": "GET /profile", "results": results},
+                     indent=2))
+    shutil.rmtree(DB_DIR)
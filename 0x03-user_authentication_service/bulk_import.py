@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Bulk register users from a CSV stream.
+
+Usage: ./bulk_import.py [file.csv] [--batch-size N] [--workers N]
+
+The CSV needs a header with `email` and `password` columns and is read
+from stdin when no file is given. Prints the created/duplicate/invalid
+counts as JSON, and the rejected rows to stderr.
+"""
+import argparse
+import csv
+import json
+import sys
+
+from auth import Auth
+
+
+def read_users(stream):
+    """Yield (email, password) pairs from a CSV stream"""
+    for row in csv.DictReader(stream):
+        yield (row.get("email") or "").strip(), row.get("password") or ""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk register users")
+    parser.add_argument("csv_file", nargs="?", help="CSV file, - for stdin")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.csv_file in (None, "-"):
+        stream = sys.stdin
+    else:
+        stream = open(args.csv_file, newline="")
+    rejected = []
+    with stream:
+        counts = Auth().register_users(read_users(stream),
+                                       batch_size=args.batch_size,
+                                       workers=args.workers,
+                                       rejected=rejected)
+    for email, reason in rejected:
+        print("{}: {}".format(email, reason), file=sys.stderr)
+    print(json.dumps(counts))
@@ -1,37 +1,105 @@
 #!/usr/bin/env python3
 """DB module
 """
-from typing import Any
-from sqlalchemy import create_engine
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Set
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 
-from user import Base, User
+from migrations import bootstrap_schema
+from user import Base, ResetToken, User, UserSession
+
+
+USER_COLUMNS = frozenset(User.__table__.columns.keys())
 
 
 class DB:
     """DB class
     """
 
-    def __init__(self) -> None:
+    def __init__(self, database_url: str = None) -> None:
         """Initialize a new DB instance
+
+        Args:
+            database_url (str): SQLAlchemy URL, defaults to the DB_URL
+                environment variable or sqlite:///a.db.
+        """
+        self._engine = self._create_engine(
+            database_url or os.getenv("DB_URL", "sqlite:///a.db"))
+        if os.getenv("DB_RESET"):
+            Base.metadata.drop_all(self._engine)
+        with self._engine.begin() as connection:
+            self.schema_version = bootstrap_schema(connection)
+        self._warm_pool(int(os.getenv("DB_POOL_WARM", 2)))
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
+
+    @staticmethod
+    def _create_engine(database_url: str) -> Engine:
+        """Create the pooled engine for a database URL.
+
+        SQLite connections are shared across request threads and run in
+        WAL mode so readers don't block the writer.
+
+        Args:
+            database_url (str): SQLAlchemy URL of the database.
+
+        Returns:
+            Engine: The configured engine.
+        """
+        url = make_url(database_url)
+        is_sqlite = url.get_backend_name() == "sqlite"
+        options = {"echo": False, "pool_pre_ping": True}
+        if is_sqlite:
+            options["connect_args"] = {"check_same_thread": False}
+        if url.database not in (None, "", ":memory:"):
+            options["pool_size"] = int(os.getenv("DB_POOL_SIZE", 5))
+            options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", 10))
+
+        engine = create_engine(database_url, **options)
+
+        if is_sqlite:
+            @event.listens_for(engine, "connect")
+            def _set_sqlite_pragmas(dbapi_connection, connection_record):
+                """Enable WAL mode on every new SQLite connection"""
+                cursor = dbapi_connection.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute("PRAGMA foreign_keys=ON")
+                cursor.close()
+
+        return engine
+
+    def _warm_pool(self, size: int) -> None:
+        """Open pooled connections ahead of the first requests.
+
+        Args:
+            size (int): Number of connections to open.
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        connections = []
+        try:
+            for _ in range(size):
+                connections.append(self._engine.connect())
+        finally:
+            for connection in connections:
+                connection.close()
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session of the current thread, one per request
+        """
+        return self.__session()
+
+    def remove_session(self) -> None:
+        """Close the session of the current thread and release its
+        connection back to the pool.
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Adds a new user to the database.
@@ -48,6 +116,56 @@ class DB:
         self._session.commit()
         return new_user
 
+    def add_users(self, users: List[Dict[str, Any]]) -> int:
+        """Adds many users with a single executemany INSERT and commit.
+
+        If the INSERT hits a constraint, e.g. an email registered
+        concurrently, it is rolled back and the rows are inserted one by
+        one, skipping those that fail.
+
+        Args:
+            users (List[Dict[str, Any]]): Rows with email and
+                hashed_password keys.
+
+        Returns:
+            int: The number of inserted users.
+        """
+        if not users:
+            return 0
+        try:
+            self._session.execute(insert(User), users)
+            self._session.commit()
+            return len(users)
+        except IntegrityError:
+            self._session.rollback()
+
+        inserted = 0
+        for user in users:
+            try:
+                self._session.execute(insert(User), [user])
+                self._session.commit()
+                inserted += 1
+            except IntegrityError:
+                self._session.rollback()
+        return inserted
+
+    def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        """Returns which of the given emails are already registered,
+        with one IN query.
+
+        Args:
+            emails (Iterable[str]): The emails to check.
+
+        Returns:
+            Set[str]: The registered emails among them.
+        """
+        emails = list(emails)
+        if not emails:
+            return set()
+        rows = self._session.query(User.email).filter(
+            User.email.in_(emails)).all()
+        return {row.email for row in rows}
+
     def find_user_by(self, **kwargs: Any) -> User:
         """Finds a user by arbitrary keyword arguments.
 
@@ -68,26 +186,177 @@ class DB:
         except InvalidRequestError:
             raise InvalidRequestError("Invalid query arguments")
 
-    def update_user(self, user_id: int, **kwargs: dict) -> None:
+    def add_session(self, user_id: int, session_id: str) -> UserSession:
+        """Adds a login session for a user.
+
+        Args:
+            user_id (int): The ID of the user.
+            session_id (str): The new session ID.
+
+        Returns:
+            UserSession: The created UserSession object.
+        """
+        user_session = UserSession(session_id=session_id, user_id=user_id)
+        self._session.add(user_session)
+        self._session.commit()
+        return user_session
+
+    def find_user_by_session_id(self, session_id: str) -> User:
+        """Finds the user owning a session through the indexed
+        sessions table.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            User: The User object owning the session.
+
+        Raises:
+            NoResultFound: If no session matches the ID.
+        """
+        try:
+            return self._session.query(User).join(
+                UserSession, UserSession.user_id == User.id).filter(
+                UserSession.session_id == session_id).one()
+        except NoResultFound:
+            raise NoResultFound("No user found with the provided session")
+
+    def delete_sessions(self, user_id: int, session_id: str = None) -> int:
+        """Deletes one session of a user, or all of them.
+
+        Args:
+            user_id (int): The ID of the user.
+            session_id (str): The session to delete, all if None.
+
+        Returns:
+            int: The number of deleted sessions.
+        """
+        query = self._session.query(UserSession).filter(
+            UserSession.user_id == user_id)
+        if session_id is not None:
+            query = query.filter(UserSession.session_id == session_id)
+        deleted = query.delete(synchronize_session=False)
+        self._session.commit()
+        return deleted
+
+    def add_reset_token(self, user_id: int, token_hash: str,
+                        expires_at: datetime) -> ResetToken:
+        """Stores a reset token digest, replacing the user's previous
+        tokens.
+
+        Args:
+            user_id (int): The ID of the user.
+            token_hash (str): SHA256 hex digest of the token.
+            expires_at (datetime): UTC expiry of the token.
+
+        Returns:
+            ResetToken: The created ResetToken object.
+        """
+        self._session.query(ResetToken).filter(
+            ResetToken.user_id == user_id).delete(synchronize_session=False)
+        reset_token = ResetToken(token_hash=token_hash, user_id=user_id,
+                                 expires_at=expires_at)
+        self._session.add(reset_token)
+        self._session.commit()
+        return reset_token
+
+    def find_reset_token(self, token_hash: str, now: datetime) -> ResetToken:
+        """Finds an unexpired reset token by its digest, a primary key
+        lookup.
+
+        Args:
+            token_hash (str): SHA256 hex digest of the token.
+            now (datetime): Current UTC time.
+
+        Returns:
+            ResetToken: The matching ResetToken object.
+
+        Raises:
+            NoResultFound: If no unexpired token matches.
+        """
+        reset_token = self._session.get(ResetToken, token_hash)
+        if reset_token is None or reset_token.expires_at <= now:
+            raise NoResultFound("No valid reset token")
+        return reset_token
+
+    def reset_password(self, user_id: int, token_hash: str, now: datetime,
+                       hashed_password: bytes) -> bool:
+        """Consumes an unexpired reset token of the user and sets the new
+        password in one transaction, so a token is only used once even
+        by concurrent requests.
+
+        Args:
+            user_id (int): The ID of the user.
+            token_hash (str): SHA256 hex digest of the token.
+            now (datetime): Current UTC time.
+            hashed_password (bytes): The new hashed password.
+
+        Returns:
+            bool: True if the token was consumed and the password set.
+        """
+        consumed = self._session.query(ResetToken).filter(
+            ResetToken.token_hash == token_hash,
+            ResetToken.user_id == user_id,
+            ResetToken.expires_at > now).delete(synchronize_session=False)
+        if consumed != 1:
+            self._session.rollback()
+            return False
+        updated = self._session.query(User).filter(
+            User.id == user_id).update({"hashed_password": hashed_password},
+                                       synchronize_session=False)
+        if updated != 1:
+            self._session.rollback()
+            return False
+        self._session.query(ResetToken).filter(
+            ResetToken.user_id == user_id).delete(synchronize_session=False)
+        self._session.commit()
+        return True
+
+    def purge_expired_reset_tokens(self, now: datetime,
+                                   batch_size: int = 500) -> int:
+        """Deletes one batch of expired reset tokens, using the
+        expires_at index.
+
+        Args:
+            now (datetime): Current UTC time.
+            batch_size (int): Maximum number of rows deleted.
+
+        Returns:
+            int: The number of deleted tokens.
+        """
+        expired = self._session.query(ResetToken.token_hash).filter(
+            ResetToken.expires_at <= now).limit(batch_size)
+        deleted = self._session.query(ResetToken).filter(
+            ResetToken.token_hash.in_(expired.scalar_subquery())).delete(
+            synchronize_session=False)
+        self._session.commit()
+        return deleted
+
+    def update_user(self, user_id: int, **kwargs: dict) -> int:
         """Updates user attributes using the user ID.
 
+        The keys are checked against the mapped columns and the change is
+        sent as a single UPDATE statement, without loading the user.
+        Users already loaded in the session keep their old values.
+
         Args:
             user_id (int): The ID of the user to update.
             **kwargs: Attributes to update with their new values.
 
+        Returns:
+            int: The number of updated rows, 0 if no user has the ID.
+
         Raises:
-            NoResultFound: If no user is found with the given ID.
             ValueError: If an invalid attribute is provided.
         """
-        try:
-            user = self.find_user_by(id=user_id)
-        except NoResultFound:
-            raise NoResultFound(f"No user found with ID {user_id}")
-
-        for key, value in kwargs.items():
-            if hasattr(user, key):
-                setattr(user, key, value)
-            else:
+        for key in kwargs:
+            if key not in USER_COLUMNS:
                 raise ValueError(f"Attribute {key} is not valid")
 
+        if not kwargs:
+            return 0
+
+        updated = self._session.query(User).filter(
+            User.id == user_id).update(kwargs, synchronize_session=False)
         self._session.commit()
+        return updated
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Request timing hooks and fixed-memory latency histograms
+"""
+import os
+import threading
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from flask import Flask, request
+
+NO_LABELS = ("", "")
+# (method, route) of the request handled by the current thread or task
+_labels: ContextVar = ContextVar("metrics_labels", default=NO_LABELS)
+
+
+class Histogram:
+    """Log-linear latency histogram over whole microseconds.
+
+    Like HDR histograms, values below 2 ** SUB_BITS get a bucket each and
+    every power of two above is split into 2 ** SUB_BITS buckets, so the
+    relative error stays under 1 / 2 ** SUB_BITS whatever the value. The
+    bucket array is allocated once: recording is O(1) and memory is fixed.
+    """
+    SUB_BITS = 4
+    MAX_MICROS = 1 << 27
+
+    def __init__(self):
+        """Allocate the empty buckets"""
+        self._sub_count = 1 << self.SUB_BITS
+        self._buckets = [0] * (self._index(self.MAX_MICROS - 1) + 1)
+        self.sum = 0.0
+
+    def _index(self, micros: int) -> int:
+        """Bucket index of a value in microseconds"""
+        sub_count = self._sub_count
+        if micros < sub_count:
+            return micros
+        shift = micros.bit_length() - self.SUB_BITS - 1
+        return sub_count * (shift + 1) + (micros >> shift) - sub_count
+
+    def _upper_bound(self, index: int) -> int:
+        """Largest value in microseconds that lands in a bucket"""
+        sub_count = self._sub_count
+        if index < sub_count:
+            return index
+        shift = index // sub_count - 1
+        return ((index % sub_count + sub_count + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        """Add one observation.
+
+        No lock on this path: under the GIL an increment can only be lost
+        to a thread switch in the middle of it, which is rare enough for
+        latency statistics and keeps a record well under a microsecond.
+        """
+        micros = int(seconds * 1000000)
+        if micros >= self.MAX_MICROS:
+            micros = self.MAX_MICROS - 1
+        self._buckets[self._index(micros)] += 1
+        self.sum += seconds
+
+    @property
+    def count(self) -> int:
+        """Number of observations"""
+        return sum(self._buckets)
+
+    def quantiles(self, fractions: Iterable[float]) -> List[float]:
+        """Upper bounds in seconds of the requested quantiles"""
+        buckets = list(self._buckets)
+        count = sum(buckets)
+        results = []
+        for fraction in fractions:
+            rank = max(1, int(fraction * count + 0.5))
+            seen = 0
+            value = 0
+            for index, bucket in enumerate(buckets):
+                seen += bucket
+                if seen >= rank:
+                    value = self._upper_bound(index)
+                    break
+            results.append(value / 1000000)
+        return results
+
+
+class Metrics:
+    """Histograms keyed by metric name and label values"""
+    QUANTILES = (0.5, 0.9, 0.99)
+    FAMILIES = {
+        "request": ("api_request_duration_seconds",
+                    "Latency of whole requests", ("method", "route")),
+        "stage": ("api_stage_duration_seconds",
+                  "Latency of instrumented stages of a request",
+                  ("stage", "method", "route")),
+    }
+
+    def __init__(self):
+        """Start without any histogram"""
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, labels: tuple, seconds: float) -> None:
+        """Hook feeding the histograms, `request` is the whole request"""
+        key = (stage, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        histogram.record(seconds)
+
+    def render(self) -> str:
+        """Prometheus text exposition of every histogram as a summary"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        for family, (name, help_text, label_names) in self.FAMILIES.items():
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} summary".format(name))
+            for (stage, values), histogram in histograms:
+                if (stage == "request") != (family == "request"):
+                    continue
+                if family == "stage":
+                    values = (stage,) + values
+                labels = ",".join('{}="{}"'.format(label, _escape(value))
+                                  for label, value in zip(label_names,
+                                                          values))
+                quantiles = histogram.quantiles(self.QUANTILES)
+                for fraction, value in zip(self.QUANTILES, quantiles):
+                    lines.append('{}{{{},quantile="{}"}} {}'.format(
+                        name, labels, fraction, repr(value)))
+                lines.append("{}_sum{{{}}} {}".format(name, labels,
+                                                      repr(histogram.sum)))
+                lines.append("{}_count{{{}}} {}".format(name, labels,
+                                                        histogram.count))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n")
+
+
+class Instrumentation:
+    """Times stages of the request path and hands the durations to hooks.
+
+    A hook is a callable `hook(stage, labels, seconds)` where labels is
+    the (method, route) of the current request, route being the URL rule
+    so that the label cardinality stays bounded. The Metrics histograms
+    are the default hook; more can be plugged with add_hook.
+    """
+
+    def __init__(self, enabled: bool = True):
+        """Create the metrics and the default hook"""
+        self.enabled = enabled
+        self.metrics = Metrics()
+        self.hooks: List[Callable] = [self.metrics.observe]
+
+    def add_hook(self, hook: Callable) -> None:
+        """Plug one more hook"""
+        self.hooks.append(hook)
+
+    def emit(self, stage: str, seconds: float) -> None:
+        """Hand a duration to every hook"""
+        labels = _labels.get()
+        for hook in self.hooks:
+            hook(stage, labels, seconds)
+
+    def timed(self, stage: str, function: Callable) -> Callable:
+        """Wrap a callable so that each call emits its duration"""
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            """Time the wrapped call"""
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.emit(stage, perf_counter() - start)
+        return wrapper
+
+    def instrument_object(self, obj, names: Iterable[str],
+                          prefix: str) -> None:
+        """Time methods of one instance, like the app's auth"""
+        if not self.enabled or obj is None:
+            return
+        for name in names:
+            if hasattr(obj, name):
+                setattr(obj, name, self.timed(
+                    "{}.{}".format(prefix, name), getattr(obj, name)))
+
+    def instrument_class(self, cls, names: Iterable[str],
+                         prefix: str) -> None:
+        """Time methods and classmethods of a class and its subclasses"""
+        if not self.enabled:
+            return
+        for name in names:
+            attribute = cls.__dict__[name]
+            stage = "{}.{}".format(prefix, name)
+            if isinstance(attribute, classmethod):
+                setattr(cls, name, classmethod(
+                    self.timed(stage, attribute.__func__)))
+            else:
+                setattr(cls, name, self.timed(stage, attribute))
+
+    def instrument_app(self, app: Flask) -> None:
+        """Time whole requests, the before_request handlers and the
+        JSON serialization. Call it once every handler is registered.
+        """
+        if not self.enabled:
+            return
+        handlers = app.before_request_funcs.setdefault(None, [])
+        handlers[:] = [self.timed("before_request", handler)
+                       for handler in handlers]
+        handlers.insert(0, self._start_request)
+        app.after_request(self._end_request)
+        app.teardown_request(self._teardown_request)
+
+        provider = getattr(app, "json", None)
+        if hasattr(provider, "response"):
+            provider.response = self.timed("serialize", provider.response)
+        else:
+            import flask.json
+            flask.json.dumps = self.timed("serialize", flask.json.dumps)
+
+    def _start_request(self) -> None:
+        """Remember the start time and the labels of the request"""
+        request.metrics_start = perf_counter()
+        rule = request.url_rule
+        _labels.set((request.method,
+                     rule.rule if rule is not None else "<unmatched>"))
+
+    def _end_request(self, response):
+        """Emit the duration of the whole request"""
+        start = getattr(request, "metrics_start", None)
+        if start is not None:
+            self.emit("request", perf_counter() - start)
+        return response
+
+    def _teardown_request(self, exception=None) -> None:
+        """Stop attributing stages to the finished request"""
+        _labels.set(NO_LABELS)
+
+
+instrumentation = Instrumentation(os.getenv("METRICS", "1") != "0")
@@ -1,73 +1,294 @@
-import requests
-
-BASE_URL = "http://localhost:5000"
-
-def register_user(email: str, password: str) -> None:
-    """ Register a new user. """
-    payload = {"email": email, "password": password}
-    response = requests.post(f"{BASE_URL}/users", json=payload)
-    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
-    assert response.json() == {"email": email, "message": "user created"}, f"Unexpected response payload: {response.json()}"
-
-def log_in_wrong_password(email: str, password: str) -> None:
-    """ Try to log in with an incorrect password. """
-    payload = {"email": email, "password": password}
-    response = requests.post(f"{BASE_URL}/sessions", json=payload)
-    assert response.status_code == 401, f"Expected status code 401, got {response.status_code}"
-
-def log_in(email: str, password: str) -> str:
-    """ Log in and return the session ID. """
-    payload = {"email": email, "password": password}
-    response = requests.post(f"{BASE_URL}/sessions", json=payload)
-    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
-    session_id = response.cookies.get("session_id")
-    assert session_id, "No session ID found"
-    return session_id
-
-def profile_unlogged() -> None:
-    """ Access profile without being logged in. """
-    response = requests.get(f"{BASE_URL}/profile")
-    assert response.status_code == 403, f"Expected status code 403, got {response.status_code}"
-
-def profile_logged(session_id: str) -> None:
-    """ Access profile while logged in. """
-    cookies = {"session_id": session_id}
-    response = requests.get(f"{BASE_URL}/profile", cookies=cookies)
-    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
-
-def log_out(session_id: str) -> None:
-    """ Log out of the session. """
-    cookies = {"session_id": session_id}
-    response = requests.delete(f"{BASE_URL}/sessions", cookies=cookies)
-    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
-
-def reset_password_token(email: str) -> str:
-    """ Request a password reset token. """
-    payload = {"email": email}
-    response = requests.post(f"{BASE_URL}/reset_password", json=payload)
-    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
-    reset_token = response.json().get("reset_token")
-    assert reset_token, "No reset token found"
-    return reset_token
-
-def update_password(email: str, reset_token: str, new_password: str) -> None:
-    """ Update password using reset token. """
-    payload = {"email": email, "reset_token": reset_token, "new_password": new_password}
-    response = requests.put(f"{BASE_URL}/reset_password", json=payload)
-    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
-    assert response.json() == {"email": email, "message": "Password updated"}, f"Unexpected response payload: {response.json()}"
-
-EMAIL = "guillaume@holberton.io"
-PASSWD = "b4l0u"
-NEW_PASSWD = "t4rt1fl3tt3"
+#!/usr/bin/env python3
+"""Load-testing harness for the user authentication service.
+
+Virtual users replay weighted scenarios (register, login, profile,
+reset, logout) concurrently and the per-route throughput and latency
+percentiles are printed as JSON.
+
+Usage:
+  ./main.py                               in-process, Flask test client
+  ./main.py --mode spawn --port 5001      spawns `app.py` on that port
+  ./main.py --mode http --url http://localhost:5000
+
+In-process and spawn modes raise the login rate limits so the harness
+measures the service, not the limiter. They run against a throwaway
+SQLite file, removed afterwards, unless DB_URL is set.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+UNLIMITED_ENV = {
+    "LOGIN_RATE_EMAIL": "1000000000/1",
+    "LOGIN_RATE_IP": "1000000000/1",
+    "BCRYPT_ADMISSION_TIMEOUT": "60",
+}
+
+DEFAULT_WEIGHTS = "register=1,login=2,profile=20,reset=1,logout=2"
+
+
+class Recorder:
+    """Collects latencies and unexpected statuses per route."""
+
+    def __init__(self) -> None:
+        """Initialize empty samples."""
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: str, seconds: float, status: int,
+               expected: int) -> None:
+        """Store one request."""
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if status != expected:
+                errors = self.errors.setdefault(route, {})
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        """Summarize throughput and latency percentiles per route."""
+        routes = {}
+        total = 0
+        for route, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            total += len(samples)
+            routes[route] = {
+                "count": len(samples),
+                "errors": self.errors.get(route, {}),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+                "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            }
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2),
+            "routes": routes,
+        }
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Return a percentile of sorted samples."""
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+class TestClientTransport:
+    """Calls the app in-process through the Flask test client."""
+
+    def __init__(self, app) -> None:
+        """Use a fresh client, it keeps its own cookies."""
+        self.client = app.test_client()
+
+    def call(self, method: str, path: str, data: dict = None) -> int:
+        """Send a request and return the status code."""
+        response = self.client.open(path, method=method, data=data)
+        self.last_json = response.get_json(silent=True)
+        return response.status_code
+
+
+class HttpTransport:
+    """Calls a running server through a requests session."""
+
+    def __init__(self, base_url: str) -> None:
+        """Use a fresh requests session, it keeps its own cookies."""
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def call(self, method: str, path: str, data: dict = None) -> int:
+        """Send a request and return the status code."""
+        response = self.session.request(method, self.base_url + path,
+                                        data=data, allow_redirects=False)
+        try:
+            self.last_json = response.json()
+        except ValueError:
+            self.last_json = None
+        return response.status_code
+
+
+class VirtualUser:
+    """One simulated client and its account state."""
+
+    def __init__(self, transport, recorder: Recorder) -> None:
+        """Start without an account."""
+        self.transport = transport
+        self.recorder = recorder
+        self.email = None
+        self.password = None
+        self.logged_in = False
+
+    def request(self, route: str, data: dict, expected: int) -> int:
+        """Send a timed request, route is `METHOD /path`."""
+        method, path = route.split(" ", 1)
+        start = time.perf_counter()
+        status = self.transport.call(method, path, data)
+        self.recorder.record(route, time.perf_counter() - start, status,
+                             expected)
+        return status
+
+    def register(self) -> None:
+        """POST /users with a new unique email."""
+        email = "load-{}@example.com".format(uuid.uuid4().hex)
+        password = uuid.uuid4().hex
+        if self.request("POST /users",
+                        {"email": email, "password": password}, 200) == 200:
+            self.email, self.password = email, password
+
+    def login(self) -> None:
+        """POST /sessions with the account credentials."""
+        if self.email is None:
+            return self.register()
+        if self.request("POST /sessions",
+                        {"email": self.email, "password": self.password},
+                        200) == 200:
+            self.logged_in = True
+
+    def profile(self) -> None:
+        """GET /profile, 200 expected only while logged in."""
+        self.request("GET /profile", None, 200 if self.logged_in else 403)
+
+    def reset(self) -> None:
+        """POST then PUT /reset_password to change the password."""
+        if self.email is None:
+            return self.register()
+        if self.request("POST /reset_password",
+                        {"email": self.email}, 200) != 200:
+            return
+        token = (self.transport.last_json or {}).get("reset_token")
+        password = uuid.uuid4().hex
+        if self.request("PUT /reset_password",
+                        {"email": self.email, "reset_token": token,
+                         "new_password": password}, 200) == 200:
+            self.password = password
+
+    def logout(self) -> None:
+        """DELETE /sessions, redirects home when logged in."""
+        if self.request("DELETE /sessions", None,
+                        302 if self.logged_in else 403) == 302:
+            self.logged_in = False
+
+
+def parse_weights(spec: str) -> Dict[str, int]:
+    """Parse `name=weight,...` into a dict."""
+    weights = {}
+    for item in spec.split(","):
+        name, weight = item.split("=")
+        if not hasattr(VirtualUser, name.strip()):
+            raise ValueError("Unknown scenario: {}".format(name))
+        weights[name.strip()] = int(weight)
+    return weights
+
+
+def run_user(make_transport, recorder: Recorder, weights: Dict[str, int],
+             deadline: float, iterations: int) -> None:
+    """Replay weighted scenarios until the deadline or iteration count."""
+    user = VirtualUser(make_transport(), recorder)
+    names = list(weights)
+    counts = [weights[name] for name in names]
+    done = 0
+    while time.monotonic() < deadline and (not iterations or
+                                           done < iterations):
+        getattr(user, random.choices(names, counts)[0])()
+        done += 1
+
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """Start app.py on a port and wait until it answers."""
+    import requests
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, **UNLIMITED_ENV)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [here, os.environ.get("PYTHONPATH")]))
+    code = "from app import app; app.run(port={}, threaded=True)".format(
+        port)
+    server = subprocess.Popen([sys.executable, "-c", code], env=env,
+                              stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    url = "http://127.0.0.1:{}/".format(port)
+    for _ in range(100):
+        try:
+            requests.get(url, timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Server did not start on port {}".format(port))
+
 
 if __name__ == "__main__":
-    register_user(EMAIL, PASSWD)
-    log_in_wrong_password(EMAIL, NEW_PASSWD)
-    profile_unlogged()
-    session_id = log_in(EMAIL, PASSWD)
-    profile_logged(session_id)
-    log_out(session_id)
-    reset_token = reset_password_token(EMAIL)
-    update_password(EMAIL, reset_token, NEW_PASSWD)
-    log_in(EMAIL, NEW_PASSWD)
+    parser = argparse.ArgumentParser(description="Load test the service")
+    parser.add_argument("--mode", choices=["inprocess", "spawn", "http"],
+                        default="inprocess")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--iterations", type=int, default=0,
+                        help="scenarios per virtual user, 0 = no limit")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    weights = parse_weights(args.weights)
+    server = None
+    db_dir = None
+    if args.mode != "http" and not os.getenv("DB_URL"):
+        db_dir = tempfile.mkdtemp()
+        os.environ["DB_URL"] = "sqlite:///" + os.path.join(db_dir,
+                                                           "load.db")
+    if args.mode == "inprocess":
+        for name, value in UNLIMITED_ENV.items():
+            os.environ.setdefault(name, value)
+        from app import app
+
+        def make_transport():
+            """Flask test client transport."""
+            return TestClientTransport(app)
+    else:
+        base_url = args.url
+        if args.mode == "spawn":
+            server = spawn_server(args.port)
+            base_url = "http://127.0.0.1:{}".format(args.port)
+
+        def make_transport():
+            """HTTP transport against the server."""
+            return HttpTransport(base_url)
+
+    recorder = Recorder()
+    start = time.monotonic()
+    deadline = start + args.duration
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_user, make_transport, recorder,
+                                   weights, deadline, args.iterations)
+                       for _ in range(args.concurrency)]
+            for future in futures:
+                future.result()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if db_dir is not None:
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+    report = recorder.report(time.monotonic() - start)
+    report["config"] = {"mode": args.mode, "concurrency": args.concurrency,
+                        "duration_s": args.duration,
+                        "iterations": args.iterations, "weights": weights}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Schema versioning and lightweight migrations
+"""
+from typing import Callable, Dict
+from sqlalchemy import (Column, Integer, Table, func, inspect, select,
+                        text)
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+
+from user import Base, User
+
+
+schema_version = Table(
+    "schema_version", Base.metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+)
+
+MIGRATIONS: Dict[int, Callable[[Connection], None]] = {}
+
+
+def migration(version: int) -> Callable:
+    """Register a migration step for a schema version.
+
+    Steps must only touch the schema (no full table rewrites) and be
+    safe to run on a database where the change already exists. Their
+    DDL is written out rather than taken from the models, so that a
+    step keeps doing what it did when the models change later on.
+
+    Args:
+        version (int): The schema version the step upgrades to.
+
+    Returns:
+        Callable: The decorator registering the step.
+    """
+    def decorator(step: Callable[[Connection], None]) -> Callable:
+        MIGRATIONS[version] = step
+        return step
+    return decorator
+
+
+@migration(1)
+def baseline(connection: Connection) -> None:
+    """Version 1: the original users table."""
+
+
+@migration(2)
+def index_lookups_and_sessions_table(connection: Connection) -> None:
+    """Version 2: index reset_token, move session ids to `sessions`."""
+    columns = [column["name"] for column in
+               inspect(connection).get_columns("users")]
+    if "reset_token" in columns:
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_reset_token "
+            "ON users (reset_token)"))
+
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        "session_id VARCHAR(250) NOT NULL, "
+        "user_id INTEGER NOT NULL, "
+        "created_at DATETIME NOT NULL, "
+        "PRIMARY KEY (session_id), "
+        "FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE)"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_sessions_user_id "
+        "ON sessions (user_id)"))
+    if "session_id" in columns:
+        connection.execute(text(
+            "INSERT INTO sessions (session_id, user_id, created_at) "
+            "SELECT session_id, id, CURRENT_TIMESTAMP FROM users "
+            "WHERE session_id IS NOT NULL"))
+
+
+@migration(3)
+def reset_tokens_table(connection: Connection) -> None:
+    """Version 3: hashed, expiring tokens in `reset_tokens`.
+
+    Raw tokens left in users.reset_token never expire, they are not
+    carried over and users have to ask for a new one.
+    """
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS reset_tokens ("
+        "token_hash VARCHAR(64) NOT NULL, "
+        "user_id INTEGER NOT NULL, "
+        "expires_at DATETIME NOT NULL, "
+        "PRIMARY KEY (token_hash), "
+        "FOREIGN KEY(user_id) REFERENCES users (id) ON DELETE CASCADE)"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_reset_tokens_expires_at "
+        "ON reset_tokens (expires_at)"))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_reset_tokens_user_id "
+        "ON reset_tokens (user_id)"))
+
+
+def latest_version() -> int:
+    """Return the version the registered migrations lead to."""
+    return max(MIGRATIONS) if MIGRATIONS else 0
+
+
+def _stamp(connection: Connection, version: int) -> None:
+    """Record a version as applied, ignoring a concurrent stamp."""
+    try:
+        with connection.begin_nested():
+            connection.execute(schema_version.insert(), {"version": version})
+    except IntegrityError:
+        pass
+
+
+def _lock_schema(connection: Connection) -> None:
+    """Serialize the bootstraps of concurrent workers until the
+    transaction ends."""
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(1033)"))
+
+
+def bootstrap_schema(connection: Connection) -> int:
+    """Create missing tables and apply pending migrations.
+
+    A new database gets the current schema and is stamped with the
+    latest version. An existing one only runs the steps newer than its
+    recorded version, so the cost doesn't depend on the amount of data.
+    The schema is locked first, so that workers starting together don't
+    both see a database as new or both run a step.
+
+    Args:
+        connection (Connection): Connection inside a transaction, with
+            no statement run yet.
+
+    Returns:
+        int: The schema version after the bootstrap.
+    """
+    _lock_schema(connection)
+    is_new = not inspect(connection).has_table(User.__tablename__)
+    Base.metadata.create_all(connection)
+
+    if is_new:
+        for version in sorted(MIGRATIONS):
+            _stamp(connection, version)
+        return latest_version()
+
+    current = connection.execute(
+        select(func.max(schema_version.c.version))).scalar() or 0
+    for version in sorted(MIGRATIONS):
+        if version > current:
+            MIGRATIONS[version](connection)
+            _stamp(connection, version)
+    return max(current, latest_version())
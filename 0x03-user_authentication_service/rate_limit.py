@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Login rate limiting and bcrypt admission control
+"""
+import asyncio
+import fcntl
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from time import monotonic, sleep, time
+from typing import AsyncIterator, Iterator, List, Optional
+
+
+def _slide(state: List[int], window: int) -> List[int]:
+    """Move a [window, current, previous] counter to a window index."""
+    if state[0] == window:
+        return state
+    if state[0] == window - 1:
+        return [window, 0, state[1]]
+    return [window, 0, 0]
+
+
+def _allowed(state: List[int], elapsed: float, limit: int) -> bool:
+    """Sliding window estimate: the previous window counts pro rata."""
+    return state[2] * (1 - elapsed) + state[1] < limit
+
+
+class MemoryCounterStore:
+    """Per-process sliding window counters, bounded by LRU eviction
+    """
+
+    def __init__(self, max_keys: int = 100000) -> None:
+        """Initialize an empty store.
+
+        Args:
+            max_keys (int): Maximum number of tracked keys.
+        """
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._counters: "OrderedDict[str, List[int]]" = OrderedDict()
+
+    def hit(self, key: str, window: int, elapsed: float, limit: int) -> bool:
+        """Count a hit for a key if it is under the limit.
+
+        Args:
+            key (str): The limited key.
+            window (int): Index of the current window.
+            elapsed (float): Elapsed fraction of the current window.
+            limit (int): Allowed hits per window.
+
+        Returns:
+            bool: True if the hit is allowed.
+        """
+        with self._lock:
+            state = _slide(self._counters.get(key, [window, 0, 0]), window)
+            allowed = _allowed(state, elapsed, limit)
+            if allowed:
+                state[1] += 1
+            self._counters[key] = state
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+            return allowed
+
+
+class SQLiteCounterStore:
+    """Sliding window counters in a SQLite file, shared by the workers
+    of a host
+    """
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str) -> None:
+        """Open the store and create its table.
+
+        Args:
+            path (str): Path of the SQLite file.
+        """
+        self.path = path
+        self._local = threading.local()
+        self._hits = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, window INTEGER NOT NULL, "
+                "current INTEGER NOT NULL, previous INTEGER NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection of the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def hit(self, key: str, window: int, elapsed: float, limit: int) -> bool:
+        """Count a hit for a key if it is under the limit.
+
+        Args:
+            key (str): The limited key.
+            window (int): Index of the current window.
+            elapsed (float): Elapsed fraction of the current window.
+            limit (int): Allowed hits per window.
+
+        Returns:
+            bool: True if the hit is allowed.
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT window, current, previous FROM rate_limits "
+                "WHERE key = ?", (key,)).fetchone()
+            state = _slide(list(row) if row else [window, 0, 0], window)
+            allowed = _allowed(state, elapsed, limit)
+            if allowed:
+                state[1] += 1
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limits "
+                "(key, window, current, previous) VALUES (?, ?, ?, ?)",
+                (key, state[0], state[1], state[2]))
+            self._hits += 1
+            if self._hits % self.PURGE_EVERY == 0:
+                connection.execute(
+                    "DELETE FROM rate_limits WHERE window < ?", (window - 1,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed
+
+
+class RateLimiter:
+    """Allow at most `limit` hits per key over a sliding `period`
+    """
+
+    def __init__(self, limit: int, period: float, store=None,
+                 name: str = "") -> None:
+        """Initialize the limiter.
+
+        Args:
+            limit (int): Allowed hits per period.
+            period (float): Length of the window in seconds.
+            store: Counter store, a MemoryCounterStore by default.
+            name (str): Key prefix separating limiters sharing a store.
+        """
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.store = store or MemoryCounterStore()
+
+    @classmethod
+    def from_env(cls, name: str, default: str, store=None) -> "RateLimiter":
+        """Build a limiter from an environment variable like `5/60`.
+
+        Args:
+            name (str): Name of the variable.
+            default (str): Value used when the variable is unset.
+            store: Counter store shared by the limiters.
+
+        Returns:
+            RateLimiter: The configured limiter.
+        """
+        limit, period = os.getenv(name, default).split("/")
+        return cls(int(limit), float(period), store, name)
+
+    def hit(self, key: str) -> bool:
+        """Count a hit, False when the key is over its limit.
+
+        Args:
+            key (str): The limited key.
+
+        Returns:
+            bool: True if the hit is allowed.
+        """
+        if key is None:
+            key = ""
+        now = time() / self.period
+        window = int(now)
+        return self.store.hit("{}:{}".format(self.name, key), window,
+                              now - window, self.limit)
+
+
+class FileSlots:
+    """Slots shared by the workers of a host: one flock()ed file per slot
+    in a directory. The kernel drops the lock of a worker that dies, so
+    a crash never leaks a slot.
+    """
+    POLL_INTERVAL = 0.002
+
+    def __init__(self, directory: str, size: int) -> None:
+        """Create the slot files.
+
+        Args:
+            directory (str): Directory holding the slot files.
+            size (int): Number of slots.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, "slot-{}".format(i))
+                      for i in range(size)]
+        for path in self.paths:
+            open(path, "a").close()
+
+    def try_acquire(self) -> Optional[int]:
+        """Lock a free slot, its file descriptor or None if all are
+        taken."""
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def acquire(self, timeout: float) -> Optional[int]:
+        """Wait up to `timeout` seconds for a free slot."""
+        deadline = monotonic() + timeout
+        fd = self.try_acquire()
+        while fd is None and monotonic() < deadline:
+            sleep(self.POLL_INTERVAL)
+            fd = self.try_acquire()
+        return fd
+
+    async def acquire_async(self, timeout: float) -> Optional[int]:
+        """Wait up to `timeout` seconds for a free slot, suspending the
+        task between two tries."""
+        deadline = monotonic() + timeout
+        fd = self.try_acquire()
+        while fd is None and monotonic() < deadline:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            fd = self.try_acquire()
+        return fd
+
+    @staticmethod
+    def release(fd: int) -> None:
+        """Free a slot returned by acquire."""
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class AdmissionController:
+    """Cap the number of concurrent expensive operations (bcrypt).
+
+    Requests that can't get a slot within `timeout` seconds are meant to
+    be shed with a 429 before the CPU is saturated. The cap is per
+    process unless `shared` FileSlots also cap the whole host.
+    """
+
+    def __init__(self, max_concurrent: int, timeout: float = 0.05,
+                 shared: Optional[FileSlots] = None) -> None:
+        """Initialize the controller.
+
+        Args:
+            max_concurrent (int): Number of operations run at once.
+            timeout (float): Seconds to wait for a free slot.
+            shared (FileSlots): Slots shared with the other workers.
+        """
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.shared = shared
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._stats = {"admitted": 0, "shed": 0}
+
+    @contextmanager
+    def slot(self) -> Iterator[bool]:
+        """Hold a slot for the block, yields False if none is free."""
+        deadline = monotonic() + self.timeout
+        admitted = self._slots.acquire(timeout=self.timeout)
+        fd = None
+        if admitted and self.shared is not None:
+            fd = self.shared.acquire(max(deadline - monotonic(), 0))
+            if fd is None:
+                self._slots.release()
+                admitted = False
+        self._count(admitted)
+        try:
+            yield admitted
+        finally:
+            if fd is not None:
+                self.shared.release(fd)
+            if admitted:
+                self._slots.release()
+
+    def _count(self, admitted: bool) -> None:
+        """Count an admitted or shed operation."""
+        with self._lock:
+            self._stats["admitted" if admitted else "shed"] += 1
+
+    def stats(self) -> dict:
+        """Return the admitted/shed counters."""
+        with self._lock:
+            return dict(self._stats)
+
+
+class AsyncAdmissionController(AdmissionController):
+    """AdmissionController for coroutines: waiting for a slot suspends
+    the task instead of blocking the event loop.
+    """
+
+    def __init__(self, max_concurrent: int, timeout: float = 0.05,
+                 shared: Optional[FileSlots] = None) -> None:
+        """Initialize the controller.
+
+        Args:
+            max_concurrent (int): Number of operations run at once.
+            timeout (float): Seconds to wait for a free slot.
+            shared (FileSlots): Slots shared with the other workers.
+        """
+        super().__init__(max_concurrent, timeout, shared)
+        self._async_slots = asyncio.BoundedSemaphore(max_concurrent)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[bool]:
+        """Hold a slot for the block, yields False if none is free."""
+        deadline = monotonic() + self.timeout
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.timeout)
+            admitted = True
+        except asyncio.TimeoutError:
+            admitted = False
+        fd = None
+        if admitted and self.shared is not None:
+            fd = await self.shared.acquire_async(
+                max(deadline - monotonic(), 0))
+            if fd is None:
+                self._async_slots.release()
+                admitted = False
+        self._count(admitted)
+        try:
+            yield admitted
+        finally:
+            if fd is not None:
+                self.shared.release(fd)
+            if admitted:
+                self._async_slots.release()
+
+
+def admission_slots(max_concurrent: int) -> Optional[FileSlots]:
+    """Host-wide admission slots in BCRYPT_SLOTS_DIR, None when unset."""
+    directory = os.getenv("BCRYPT_SLOTS_DIR")
+    if directory:
+        return FileSlots(directory, max_concurrent)
+    return None
+
+
+def counter_store():
+    """Counter store from RATE_LIMIT_DB, in memory when unset."""
+    path = os.getenv("RATE_LIMIT_DB")
+    if path:
+        return SQLiteCounterStore(path)
+    return MemoryCounterStore(int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000)))
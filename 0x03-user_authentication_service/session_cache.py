@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""In-process session to user cache
+"""
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional
+
+
+SessionUser = namedtuple("SessionUser", ["id", "email"])
+
+
+class SessionCache:
+    """Bounded LRU from session ID to a SessionUser.
+
+    Unknown session IDs can be remembered in a separate, smaller LRU so a
+    flood of guessed cookies neither reaches the database nor evicts the
+    real sessions. Entries expire after `ttl` seconds, which bounds how
+    long another worker's logout can go unnoticed.
+
+    Every invalidation bumps a generation counter. A lookup reads it
+    before going to the database and passes it to `put`, which drops the
+    result if an invalidation happened meanwhile: a session destroyed
+    while it was being read is never cached as valid.
+    """
+
+    def __init__(self, maxsize: int = 10000, negative_maxsize: int = 1000,
+                 ttl: float = 60.0) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            maxsize (int): Maximum number of known sessions kept.
+            negative_maxsize (int): Maximum number of unknown session IDs
+                kept, 0 disables negative caching.
+            ttl (float): Lifetime of an entry in seconds.
+        """
+        self.maxsize = maxsize
+        self.negative_maxsize = negative_maxsize
+        self.ttl = ttl
+        self._lock = Lock()
+        self._users: "OrderedDict[str, tuple]" = OrderedDict()
+        self._unknown: "OrderedDict[str, float]" = OrderedDict()
+        self._sessions_by_user: Dict[int, set] = {}
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "negative_hits": 0,
+                       "evictions": 0, "stale_puts": 0}
+
+    def generation(self) -> int:
+        """Return the current generation, to pass to `put`."""
+        return self._generation
+
+    def get(self, session_id: str) -> tuple:
+        """Look a session ID up.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            tuple: (True, SessionUser) for a cached session, (True, None)
+                for a cached unknown ID, (False, None) on a miss.
+        """
+        now = monotonic()
+        with self._lock:
+            entry = self._users.get(session_id)
+            if entry is not None and entry[1] > now:
+                self._users.move_to_end(session_id)
+                self._stats["hits"] += 1
+                return True, entry[0]
+
+            expiry = self._unknown.get(session_id)
+            if expiry is not None and expiry > now:
+                self._stats["negative_hits"] += 1
+                return True, None
+
+            self._stats["misses"] += 1
+            return False, None
+
+    def put(self, session_id: str, user: Optional[SessionUser],
+            generation: Optional[int] = None) -> None:
+        """Store the result of a database lookup.
+
+        Args:
+            session_id (str): The session ID.
+            user (Optional[SessionUser]): The owner, None if unknown.
+            generation (Optional[int]): The generation read before the
+                lookup, the result is dropped if it is no longer current.
+        """
+        expiry = monotonic() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._stats["stale_puts"] += 1
+                return
+            if user is None:
+                if self.negative_maxsize <= 0:
+                    return
+                self._unknown[session_id] = expiry
+                self._unknown.move_to_end(session_id)
+                while len(self._unknown) > self.negative_maxsize:
+                    self._unknown.popitem(last=False)
+                return
+
+            self._unknown.pop(session_id, None)
+            self._drop(session_id)
+            self._users[session_id] = (user, expiry)
+            self._sessions_by_user.setdefault(user.id, set()).add(session_id)
+            while len(self._users) > self.maxsize:
+                self._drop(next(iter(self._users)))
+                self._stats["evictions"] += 1
+
+    def _drop(self, session_id: str) -> None:
+        """Remove a known session, the lock must be held."""
+        entry = self._users.pop(session_id, None)
+        if entry is None:
+            return
+        sessions = self._sessions_by_user.get(entry[0].id)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self._sessions_by_user[entry[0].id]
+
+    def invalidate(self, session_id: str) -> None:
+        """Forget a session ID, known or unknown.
+
+        Args:
+            session_id (str): The session ID.
+        """
+        with self._lock:
+            self._generation += 1
+            self._drop(session_id)
+            self._unknown.pop(session_id, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forget every cached session of a user.
+
+        Args:
+            user_id (int): The ID of the user.
+        """
+        with self._lock:
+            self._generation += 1
+            for session_id in list(self._sessions_by_user.get(user_id, ())):
+                self._drop(session_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss counters and the current sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._users)
+            stats["negative_size"] = len(self._unknown)
+        return stats
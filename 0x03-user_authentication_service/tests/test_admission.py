@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Tests of the bcrypt admission control of both apps
+"""
+import asyncio
+import tempfile
+import threading
+import unittest
+
+from rate_limit import (AdmissionController, AsyncAdmissionController,
+                        FileSlots)
+
+
+class TestAdmissionController(unittest.TestCase):
+    """Tests of the threaded AdmissionController"""
+
+    def test_sheds_over_capacity(self) -> None:
+        """A slot is refused while every slot is held"""
+        admission = AdmissionController(1, timeout=0.01)
+        held = threading.Event()
+        release = threading.Event()
+
+        def hold() -> None:
+            """Hold the only slot until released"""
+            with admission.slot():
+                held.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        held.wait()
+        with admission.slot() as admitted:
+            self.assertFalse(admitted)
+        release.set()
+        holder.join()
+        with admission.slot() as admitted:
+            self.assertTrue(admitted)
+        self.assertEqual(admission.stats(), {"admitted": 2, "shed": 1})
+
+    def test_shared_slots(self) -> None:
+        """Controllers sharing FileSlots, like two workers, are capped
+        together"""
+        with tempfile.TemporaryDirectory() as directory:
+            first = AdmissionController(1, 0.01, FileSlots(directory, 1))
+            second = AdmissionController(1, 0.01, FileSlots(directory, 1))
+            with first.slot() as admitted:
+                self.assertTrue(admitted)
+                with second.slot() as shed:
+                    self.assertFalse(shed)
+            with second.slot() as admitted:
+                self.assertTrue(admitted)
+            self.assertEqual(second.stats(), {"admitted": 1, "shed": 1})
+
+
+class TestAsyncAdmissionController(unittest.TestCase):
+    """Tests of the asyncio AsyncAdmissionController"""
+
+    def test_sheds_over_capacity(self) -> None:
+        """A task is refused a slot while every slot is held, without
+        blocking the event loop"""
+        admission = AsyncAdmissionController(1, timeout=0.01)
+
+        async def scenario() -> list:
+            """Hold the slot in one task, try in another"""
+            held = asyncio.Event()
+            release = asyncio.Event()
+
+            async def hold() -> bool:
+                """Hold the only slot until released"""
+                async with admission.slot() as admitted:
+                    held.set()
+                    await release.wait()
+                    return admitted
+
+            holder = asyncio.ensure_future(hold())
+            await held.wait()
+            async with admission.slot() as second:
+                pass
+            release.set()
+            first = await holder
+            async with admission.slot() as third:
+                pass
+            return [first, second, third]
+
+        self.assertEqual(asyncio.run(scenario()), [True, False, True])
+        self.assertEqual(admission.stats(), {"admitted": 2, "shed": 1})
+
+    def test_shared_slots(self) -> None:
+        """A task is refused a slot held by another worker's controller"""
+        with tempfile.TemporaryDirectory() as directory:
+            worker = AdmissionController(1, 0.01, FileSlots(directory, 1))
+            admission = AsyncAdmissionController(1, 0.01,
+                                                 FileSlots(directory, 1))
+
+            async def attempt() -> bool:
+                """Try to get a slot"""
+                async with admission.slot() as admitted:
+                    return admitted
+
+            with worker.slot():
+                shed = asyncio.run(attempt())
+            self.assertEqual([shed, asyncio.run(attempt())], [False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Tests of the Quart app, skipped without the async requirements
+"""
+from unittest import mock
+import asyncio
+import importlib
+import os
+import sys
+import tempfile
+import unittest
+
+try:
+    import quart  # noqa: F401
+    import aiosqlite  # noqa: F401
+except ImportError:
+    quart = None
+
+
+@unittest.skipIf(quart is None, "needs requirements-async.txt")
+class TestAsyncApp(unittest.TestCase):
+    """Register, log in and read the profile through async_app"""
+
+    def setUp(self) -> None:
+        """Load the app on a throwaway database"""
+        self.directory = tempfile.TemporaryDirectory()
+        url = "sqlite+aiosqlite:///" + os.path.join(self.directory.name,
+                                                    "test.db")
+        with mock.patch.dict(os.environ, {"ASYNC_DB_URL": url}):
+            sys.modules.pop("async_app", None)
+            self.module = importlib.import_module("async_app")
+
+    def tearDown(self) -> None:
+        """Drop the database"""
+        sys.modules.pop("async_app", None)
+        self.directory.cleanup()
+
+    def test_login_profile_round_trip(self) -> None:
+        """A registered user logs in, reads the profile, and loses it on
+        logout; the second profile read and the logout hit the session
+        cache"""
+        app = self.module.app
+        auth = self.module.AUTH
+
+        async def scenario() -> list:
+            """Run the requests inside the app lifespan"""
+            async with app.test_app():
+                client = app.test_client()
+                form = {"email": "bob@hbtn.io", "password": "secret"}
+                statuses = [(await client.post("/users", form=form))
+                            .status_code]
+                login = await client.post("/sessions", form=form)
+                statuses.append(login.status_code)
+                for _ in range(2):
+                    profile = await client.get("/profile")
+                    statuses.append(await profile.get_json())
+                statuses.append((await client.delete("/sessions"))
+                                .status_code)
+                statuses.append((await client.get("/profile")).status_code)
+                return statuses
+
+        self.assertEqual(asyncio.run(scenario()),
+                         [200, 200, {"email": "bob@hbtn.io"},
+                          {"email": "bob@hbtn.io"}, 302, 403])
+        self.assertEqual(auth.session_cache.stats()["hits"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
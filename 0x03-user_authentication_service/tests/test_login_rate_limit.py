@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Tests of the login rate limits of app.py
+"""
+from unittest import mock
+import importlib
+import os
+import sys
+import tempfile
+import unittest
+
+
+class TestLoginRateLimit(unittest.TestCase):
+    """Failed logins on one email from several clients"""
+
+    def setUp(self) -> None:
+        """Load the app on a throwaway database with a user"""
+        self.directory = tempfile.TemporaryDirectory()
+        env = {"DB_URL": "sqlite:///" + os.path.join(self.directory.name,
+                                                     "test.db"),
+               "LOGIN_RATE_EMAIL": "2/60", "LOGIN_RATE_IP": "100/60"}
+        with mock.patch.dict(os.environ, env):
+            sys.modules.pop("app", None)
+            self.app = importlib.import_module("app")
+        self.app.AUTH.register_user("bob@hbtn.io", "secret")
+        self.app.AUTH.end_request()
+        self.client = self.app.app.test_client()
+
+    def tearDown(self) -> None:
+        """Drop the database"""
+        self.app.AUTH._db._engine.dispose()
+        sys.modules.pop("app", None)
+        self.directory.cleanup()
+
+    def login(self, address: str, password: str) -> int:
+        """Status of a login from a client address"""
+        return self.client.post(
+            "/sessions", data={"email": "bob@hbtn.io", "password": password},
+            environ_base={"REMOTE_ADDR": address}).status_code
+
+    def test_attacker_does_not_lock_out_owner(self) -> None:
+        """Failures from one client limit that client only"""
+        statuses = [self.login("10.0.0.1", "guess") for _ in range(3)]
+        self.assertEqual(statuses, [401, 401, 429])
+        self.assertEqual(self.login("10.0.0.2", "secret"), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
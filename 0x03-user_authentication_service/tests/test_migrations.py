@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Tests of the schema bootstrap and migrations
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import inspect
+
+from db import DB
+from migrations import latest_version
+
+
+class TestBootstrapSchema(unittest.TestCase):
+    """bootstrap_schema on new and old databases"""
+
+    def setUp(self) -> None:
+        """Throwaway database path"""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.db")
+        self.url = "sqlite:///" + self.path
+
+    def tearDown(self) -> None:
+        """Drop the database"""
+        self.directory.cleanup()
+
+    def test_upgrade_baseline(self) -> None:
+        """A version 1 database gets the frozen steps, and its session
+        ids are carried over"""
+        connection = sqlite3.connect(self.path)
+        connection.executescript(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, "
+            "email VARCHAR(250) NOT NULL UNIQUE, "
+            "hashed_password VARCHAR(250) NOT NULL, "
+            "session_id VARCHAR(250), reset_token VARCHAR(250));"
+            "CREATE TABLE schema_version (version INTEGER PRIMARY KEY);"
+            "INSERT INTO schema_version VALUES (1);"
+            "INSERT INTO users VALUES (1, 'bob@hbtn.io', 'x', 'sid', NULL);")
+        connection.close()
+
+        db = DB(self.url)
+        self.assertEqual(db.schema_version, latest_version())
+        indexes = [index["name"] for index in
+                   inspect(db._engine).get_indexes("users")]
+        self.assertIn("ix_users_reset_token", indexes)
+        self.assertEqual(db.find_user_by_session_id("sid").id, 1)
+        db._engine.dispose()
+
+    def test_concurrent_bootstraps(self) -> None:
+        """Workers starting together on a new database all succeed and
+        stamp every version once"""
+        barrier = threading.Barrier(4, timeout=10)
+
+        def start(_) -> int:
+            """Start a worker"""
+            barrier.wait()
+            db = DB(self.url)
+            db._engine.dispose()
+            return db.schema_version
+
+        with ThreadPoolExecutor(4) as executor:
+            versions = list(executor.map(start, range(4)))
+        self.assertEqual(versions, [latest_version()] * 4)
+        connection = sqlite3.connect(self.path)
+        stamps = connection.execute(
+            "SELECT version FROM schema_version ORDER BY version").fetchall()
+        connection.close()
+        self.assertEqual([version for version, in stamps],
+                         list(range(1, latest_version() + 1)))
+
+    def test_async_bootstrap(self) -> None:
+        """The async database bootstraps through the same lock"""
+        try:
+            from async_db import AsyncDB
+        except ImportError as e:
+            self.skipTest(str(e))
+
+        async def setup() -> int:
+            """Bootstrap a new database"""
+            db = AsyncDB("sqlite+aiosqlite:///" + self.path)
+            await db.setup()
+            await db.dispose()
+            return db.schema_version
+
+        self.assertEqual(asyncio.run(setup()), latest_version())
+
+
+if __name__ == "__main__":
+    unittest.main()
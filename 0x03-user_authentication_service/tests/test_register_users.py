@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Tests of the bulk registration of users
+"""
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+import auth as auth_module
+
+
+class TestRegisterUsers(unittest.TestCase):
+    """register_users on invalid and duplicate rows"""
+
+    def setUp(self) -> None:
+        """Auth on a throwaway database with one user"""
+        self.directory = tempfile.TemporaryDirectory()
+        url = "sqlite:///" + os.path.join(self.directory.name, "test.db")
+        with mock.patch.dict(os.environ, {"DB_URL": url}):
+            self.auth = auth_module.Auth()
+        self.auth.register_user("bob@hbtn.io", "secret")
+
+    def tearDown(self) -> None:
+        """Drop the database"""
+        self.auth.end_request()
+        self.auth._db._engine.dispose()
+        self.directory.cleanup()
+
+    def test_duplicates(self) -> None:
+        """Emails already registered or repeated in the import are
+        skipped"""
+        counts = self.auth.register_users(
+            [("bob@hbtn.io", "a"), ("amy@hbtn.io", "b"),
+             ("amy@hbtn.io", "c")], workers=1)
+        self.assertEqual(counts,
+                         {"created": 1, "duplicates": 2, "invalid": 0})
+        self.assertTrue(self.auth.valid_login("amy@hbtn.io", "b"))
+
+    def test_password_too_long(self) -> None:
+        """A password bcrypt can't hash rejects its row only"""
+        rejected = []
+        counts = self.auth.register_users(
+            [("amy@hbtn.io", "x" * 73), ("tom@hbtn.io", "b"),
+             ("", "c")], workers=1, rejected=rejected)
+        self.assertEqual(counts,
+                         {"created": 1, "duplicates": 0, "invalid": 2})
+        self.assertEqual([email for email, _ in rejected],
+                         ["amy@hbtn.io", ""])
+        self.assertTrue(self.auth.valid_login("tom@hbtn.io", "b"))
+
+    def test_concurrent_duplicate(self) -> None:
+        """An email registered between the duplicate check and the
+        INSERT skips its row, the rest of the batch is created"""
+        existing_emails = self.auth._db.existing_emails
+
+        def registered_meanwhile(emails) -> set:
+            """Check, then let another request register amy"""
+            found = existing_emails(emails)
+            self.auth._db.add_user("amy@hbtn.io", b"hash")
+            return found
+
+        with mock.patch.object(self.auth._db, "existing_emails",
+                               registered_meanwhile):
+            counts = self.auth.register_users(
+                [("amy@hbtn.io", "a"), ("tom@hbtn.io", "b"),
+                 ("eve@hbtn.io", "c")], workers=1)
+        self.assertEqual(counts,
+                         {"created": 2, "duplicates": 1, "invalid": 0})
+        self.assertTrue(self.auth.valid_login("tom@hbtn.io", "b"))
+        self.assertTrue(self.auth.valid_login("eve@hbtn.io", "c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Tests of single-use reset tokens under concurrent requests
+"""
+from unittest import mock
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+import auth as auth_module
+
+
+class TestResetPasswordRace(unittest.TestCase):
+    """Two concurrent resets with the same token"""
+
+    def setUp(self) -> None:
+        """Create a user with a reset token on a throwaway database"""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.db")
+        self.url = "sqlite:///" + self.path
+        with mock.patch.dict(os.environ, {"DB_URL": self.url}):
+            self.auth = auth_module.Auth()
+        self.auth.register_user("bob@hbtn.io", "old")
+        self.token = self.auth.get_reset_password_token("bob@hbtn.io")
+        self.auth.end_request()
+
+    def tearDown(self) -> None:
+        """Drop the database"""
+        self.auth.end_request()
+        self.auth._db._engine.dispose()
+        self.directory.cleanup()
+
+    def test_token_used_once(self) -> None:
+        """Only one of two concurrent resets with a token succeeds"""
+        barrier = threading.Barrier(2, timeout=10)
+        hash_password = auth_module._hash_password
+        results = []
+
+        def hash_together(password: str) -> bytes:
+            """Hash once both requests have checked the token"""
+            barrier.wait()
+            return hash_password(password)
+
+        def reset(password: str) -> None:
+            """Reset the password in a request of its own"""
+            try:
+                self.auth.update_password(self.token, password)
+                results.append(password)
+            except ValueError:
+                results.append(None)
+            finally:
+                self.auth.end_request()
+
+        with mock.patch.object(auth_module, "_hash_password",
+                               hash_together):
+            threads = [threading.Thread(target=reset, args=(password,))
+                       for password in ("new1", "new2")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(results.count(None), 1)
+        winner = next(password for password in results if password)
+        self.assertTrue(self.auth.valid_login("bob@hbtn.io", winner))
+        with self.assertRaises(ValueError):
+            self.auth.update_password(self.token, "new3")
+
+    def test_async_token_used_once(self) -> None:
+        """Only one of two concurrent async resets with a token
+        succeeds"""
+        try:
+            from async_auth import AsyncAuth
+        except ImportError as e:
+            self.skipTest(str(e))
+        with mock.patch.dict(os.environ, {
+                "ASYNC_DB_URL": "sqlite+aiosqlite:///" + self.path}):
+            async_auth = AsyncAuth()
+
+        async def scenario() -> list:
+            """Both resets check the token before either consumes it"""
+            await async_auth.setup()
+            find = async_auth._db.find_reset_token
+            checked = asyncio.Event()
+            waiting = []
+
+            async def find_together(token_hash, now):
+                """Find, then wait for the other request to find too"""
+                token = await find(token_hash, now)
+                waiting.append(token)
+                if len(waiting) == 2:
+                    checked.set()
+                await checked.wait()
+                return token
+
+            async def reset(password: str):
+                """Reset the password, None if refused"""
+                try:
+                    await async_auth.update_password(self.token, password)
+                    return password
+                except ValueError:
+                    return None
+
+            with mock.patch.object(async_auth._db, "find_reset_token",
+                                   find_together):
+                results = await asyncio.gather(reset("new1"),
+                                               reset("new2"))
+            await async_auth.close()
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results.count(None), 1)
+
+
+class TestResetTokenSweeper(unittest.TestCase):
+    """The background purge of expired reset tokens"""
+
+    def test_sweeper_survives_errors(self) -> None:
+        """A failed sweep is logged and the next one still runs"""
+        from sqlalchemy.exc import OperationalError
+        with tempfile.TemporaryDirectory() as directory:
+            url = "sqlite:///" + os.path.join(directory, "test.db")
+            with mock.patch.dict(os.environ, {"DB_URL": url}):
+                auth = auth_module.Auth()
+            swept = threading.Event()
+            calls = []
+
+            def purge(now, batch_size):
+                """Fail once, then report an empty batch"""
+                calls.append(now)
+                if len(calls) == 1:
+                    raise OperationalError("DELETE", {}, Exception("locked"))
+                swept.set()
+                return 0
+
+            with mock.patch.object(auth._db, "purge_expired_reset_tokens",
+                                   purge), \
+                    self.assertLogs("auth", "ERROR"):
+                thread = auth.start_reset_token_sweeper(0.01)
+                self.assertTrue(swept.wait(5))
+                auth.stop_reset_token_sweeper()
+                thread.join(5)
+            self.assertFalse(thread.is_alive())
+            auth._db._engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
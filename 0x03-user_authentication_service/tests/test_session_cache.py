@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Tests of the session cache against concurrent logouts
+"""
+from unittest import mock
+import os
+import tempfile
+import unittest
+
+from session_cache import SessionCache, SessionUser
+
+
+class TestSessionCache(unittest.TestCase):
+    """Tests of SessionCache generations"""
+
+    def setUp(self) -> None:
+        """Create an empty cache"""
+        self.cache = SessionCache()
+        self.user = SessionUser(id=1, email="bob@hbtn.io")
+
+    def test_put_current_generation(self) -> None:
+        """A lookup with no invalidation meanwhile is cached"""
+        generation = self.cache.generation()
+        self.cache.put("sid", self.user, generation)
+        self.assertEqual(self.cache.get("sid"), (True, self.user))
+
+    def test_put_after_invalidate_dropped(self) -> None:
+        """A lookup that raced a logout is not cached"""
+        generation = self.cache.generation()
+        self.cache.invalidate("sid")
+        self.cache.put("sid", self.user, generation)
+        self.assertEqual(self.cache.get("sid"), (False, None))
+        self.assertEqual(self.cache.stats()["stale_puts"], 1)
+
+    def test_put_after_invalidate_user_dropped(self) -> None:
+        """A lookup that raced a password reset is not cached"""
+        generation = self.cache.generation()
+        self.cache.invalidate_user(self.user.id)
+        self.cache.put("sid", self.user, generation)
+        self.assertEqual(self.cache.get("sid"), (False, None))
+
+    def test_negative_put_after_invalidate_dropped(self) -> None:
+        """A miss that raced a login is not cached as unknown"""
+        generation = self.cache.generation()
+        self.cache.invalidate("sid")
+        self.cache.put("sid", None, generation)
+        self.assertEqual(self.cache.get("sid"), (False, None))
+
+
+class TestAuthSessionRace(unittest.TestCase):
+    """Tests of Auth.get_user_from_session_id racing destroy_session"""
+
+    def setUp(self) -> None:
+        """Create an Auth on a throwaway database"""
+        self.directory = tempfile.TemporaryDirectory()
+        url = "sqlite:///" + os.path.join(self.directory.name, "test.db")
+        with mock.patch.dict(os.environ, {"DB_URL": url}):
+            from auth import Auth
+            self.auth = Auth()
+
+    def tearDown(self) -> None:
+        """Drop the database"""
+        self.auth.end_request()
+        self.auth._db._engine.dispose()
+        self.directory.cleanup()
+
+    def test_logout_during_lookup(self) -> None:
+        """A session destroyed while it is read from the database stays
+        logged out"""
+        user = self.auth.register_user("bob@hbtn.io", "pwd")
+        session_id = self.auth.create_session("bob@hbtn.io")
+        find = self.auth._db.find_user_by_session_id
+
+        def find_then_logout(sid: str):
+            """Read the session, then let another thread log it out"""
+            found = find(sid)
+            self.auth.destroy_session(user.id, sid)
+            return found
+
+        with mock.patch.object(self.auth._db, "find_user_by_session_id",
+                               find_then_logout):
+            self.assertIsNotNone(
+                self.auth.get_user_from_session_id(session_id))
+        self.assertIsNone(self.auth.get_user_from_session_id(session_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Creates a user model"""
-from sqlalchemy import Column, Integer, String
+from datetime import datetime
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 
@@ -14,17 +15,51 @@ class User(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     email = Column(String(250), nullable=False, unique=True)
     hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
 
-    def __init__(self, email: str, hashed_password: str,
-                 session_id: str = None, reset_token: str = None):
+    def __init__(self, email: str, hashed_password: str):
         """Instanitiates field values"""
         self.email = email
         self.hashed_password = hashed_password
-        self.session_id = session_id
-        self.reset_token = reset_token
 
     def __repr__(self):
         """String rep for User model"""
         return f"<User(id={self.id}, email={self.email})>"
+
+
+class UserSession(Base):
+    """Defines a login session, a user can have several"""
+    __tablename__ = 'sessions'
+
+    session_id = Column(String(250), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'),
+                     nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, session_id: str, user_id: int):
+        """Instanitiates field values"""
+        self.session_id = session_id
+        self.user_id = user_id
+
+    def __repr__(self):
+        """String rep for UserSession model"""
+        return f"<UserSession(user_id={self.user_id})>"
+
+
+class ResetToken(Base):
+    """Defines a password reset token, stored as its SHA256 digest"""
+    __tablename__ = 'reset_tokens'
+
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'),
+                     nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __init__(self, token_hash: str, user_id: int, expires_at: datetime):
+        """Instanitiates field values"""
+        self.token_hash = token_hash
+        self.user_id = user_id
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        """String rep for ResetToken model"""
+        return f"<ResetToken(user_id={self.user_id})>"